@@ -0,0 +1,93 @@
+class AdaptiveController:
+    """Adjusts detection scale and frame stride to hold a target processing latency.
+
+    record() is fed the measured time and face count of every processed
+    frame; the cost of a camera frame is that latency spread over the stride.
+    Above the target the controller first lowers the detection scale, or
+    raises the stride when frames are crowded (encoding every face then
+    dominates and a smaller detection image barely helps). With headroom it
+    undoes those steps in reverse, but only when the predicted cost after the
+    step still fits, and at most every `adjust_interval` processed frames, so
+    the settings do not oscillate.
+    """
+
+    def __init__(self, target_latency=0.1, scale=0.25, min_scale=0.15, max_scale=0.5, scale_step=0.05,
+                 max_stride=4, crowded_faces=4, adjust_interval=10, smoothing=0.2):
+        self.target_latency = target_latency
+        self.scale = scale
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale_step = scale_step
+        self.stride = 1
+        self.max_stride = max_stride
+        self.crowded_faces = crowded_faces
+        self.adjust_interval = adjust_interval
+        self.smoothing = smoothing
+        self.latency = None
+        self.faces = 0.0
+        self.frames_since_adjust = 0
+        self.frame_counter = 0
+
+    def should_skip(self):
+        """Count an incoming frame; True when it falls between two strided frames"""
+        self.frame_counter += 1
+        if self.frame_counter >= self.stride:
+            self.frame_counter = 0
+            return False
+        return True
+
+    def record(self, elapsed, faces):
+        if self.latency is None:
+            self.latency, self.faces = elapsed, float(faces)
+        else:
+            self.latency += self.smoothing * (elapsed - self.latency)
+            self.faces += self.smoothing * (faces - self.faces)
+
+        self.frames_since_adjust += 1
+        if self.frames_since_adjust < self.adjust_interval:
+            return
+        if self.frame_cost > self.target_latency * 1.1:
+            self._slow_down()
+        elif self.frame_cost < self.target_latency * 0.9:
+            self._speed_up()
+
+    @property
+    def frame_cost(self):
+        """Smoothed processing time per camera frame"""
+        return self.latency / self.stride
+
+    def _slow_down(self):
+        crowded = self.faces >= self.crowded_faces
+        if (crowded or self.scale <= self.min_scale) and self.stride < self.max_stride:
+            self.stride += 1
+        elif self.scale > self.min_scale:
+            self.scale = round(max(self.min_scale, self.scale - self.scale_step), 3)
+        else:
+            return
+        self.frames_since_adjust = 0
+
+    def _speed_up(self):
+        headroom = self.target_latency * 0.9
+        if self.stride > 1:
+            if self.latency / (self.stride - 1) >= headroom:
+                return
+            self.stride -= 1
+        elif self.scale < self.max_scale:
+            scale = round(min(self.max_scale, self.scale + self.scale_step), 3)
+            # Detection time grows with the image area
+            if self.latency * (scale / self.scale) ** 2 >= headroom:
+                return
+            self.scale = scale
+        else:
+            return
+        self.frames_since_adjust = 0
+
+    def status(self):
+        return {
+            "scale": self.scale,
+            "stride": self.stride,
+            "latency_ms": self.latency * 1000.0 if self.latency is not None else None,
+            "frame_cost_ms": self.frame_cost * 1000.0 if self.latency is not None else None,
+            "faces": self.faces,
+            "target_latency_ms": self.target_latency * 1000.0,
+        }
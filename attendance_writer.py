@@ -0,0 +1,86 @@
+import logging
+import threading
+
+
+class AttendanceWriter:
+    """Write-behind queue for attendance records.
+
+    Recognitions are deduplicated by (seance, person) and flushed with one
+    batched transaction every `flush_interval` seconds, as soon as
+    `flush_size` records are pending, and on stop().
+    """
+
+    def __init__(self, attendance_db, flush_interval=2.0, flush_size=50):
+        self.attendance_db = attendance_db
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.pending = {}
+        self.written = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        if self.is_running:
+            return
+        with self.lock:
+            self.written = {}
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.is_running = False
+        self.wake_event.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5.0)
+        self.thread = None
+        self.flush()
+
+    def record(self, seance_id, person_id, status, person_type='student'):
+        """Queue an attendance record; returns True if it is not already stored or pending"""
+        key = (seance_id, person_type, str(person_id))
+        with self.lock:
+            if self.pending.get(key) == status or (key not in self.pending and self.written.get(key) == status):
+                return False
+            self.pending[key] = status
+            if len(self.pending) >= self.flush_size:
+                self.wake_event.set()
+        return True
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return True
+
+            records = [(seance_id, person_id, status, person_type)
+                       for (seance_id, person_type, person_id), status in batch.items()]
+            try:
+                success = self.attendance_db.record_attendance_batch(records)
+            except Exception as e:
+                logging.error(f"Error flushing attendance batch: {e}")
+                success = False
+
+            with self.lock:
+                if success:
+                    self.written.update(batch)
+                else:
+                    # Keep records for the next flush unless a newer status was queued meanwhile
+                    for key, status in batch.items():
+                        self.pending.setdefault(key, status)
+            if success:
+                logging.info(f"Flushed {len(records)} attendance records")
+            else:
+                logging.warning(f"Failed to flush {len(records)} attendance records, will retry")
+            return success
+
+    def _run(self):
+        while self.is_running:
+            self.wake_event.wait(self.flush_interval)
+            self.wake_event.clear()
+            if self.is_running:
+                self.flush()
@@ -0,0 +1,312 @@
+"""Headless benchmark of the recognition and training pipelines.
+
+Replays a recorded video, image folder or stream through detection, encoding,
+classification and attendance recording (against an in-memory attendance
+store, so no camera, GPU or MySQL server is needed) and reports per-stage
+latency percentiles, throughput and peak memory. With --baseline the run
+fails when it regresses against a stored result.
+
+    python benchmark.py recordings/lecture.mp4 --baseline benchmark_baseline.json
+    python benchmark.py dataset/students --mode training --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+from attendance_writer import AttendanceWriter
+from face_detector import DETECTOR_BACKENDS
+from frame_source import open_frame_source
+from config import VALID_IMAGE_EXTENSIONS, DETECTOR_BACKEND, DETECTION_SCALE
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start)
+
+    def summary(self):
+        return {stage: latency_summary(samples) for stage, samples in self.samples.items()}
+
+
+class MemoryAttendanceDB:
+    """Attendance store used instead of MySQL while benchmarking"""
+
+    def __init__(self):
+        self.rows = {}
+        self.batches = 0
+
+    def record_attendance_batch(self, records):
+        self.batches += 1
+        for seance_id, person_id, status, person_type in records:
+            self.rows[(seance_id, person_type, person_id)] = status
+        return True
+
+
+def latency_summary(samples):
+    values = np.array(samples) * 1000.0
+    return {
+        "count": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024.0 * 1024.0)
+    except (ImportError, AttributeError):
+        return None
+
+
+def list_images(path):
+    images = []
+    for root, _, files in os.walk(path):
+        images.extend(os.path.join(root, name) for name in files if name.lower().endswith(VALID_IMAGE_EXTENSIONS))
+    return sorted(images)
+
+
+def replay_frames(source, max_frames=None, paced=False):
+    """Yield BGR frames from a video file, image folder or stream"""
+    frame_source = open_frame_source(source, paced=paced)
+    if not frame_source.open():
+        raise FileNotFoundError(f"Cannot open frame source: {source}")
+    count = 0
+    try:
+        while not max_frames or count < max_frames:
+            ret, frame = frame_source.read()
+            if not ret:
+                if frame_source.finished or not frame_source.is_live:
+                    break
+                continue
+            yield frame
+            count += 1
+    finally:
+        frame_source.release()
+
+
+def run_recognition_benchmark(args):
+    from recognition_pipeline import RecognitionPipeline, load_recognition_model
+
+    try:
+        model, reverse_label_map, face_index = load_recognition_model()
+    except FileNotFoundError:
+        print("No trained model found: benchmarking detection and encoding only")
+        model, reverse_label_map, face_index = None, None, None
+
+    timer = StageTimer()
+    pipeline = RecognitionPipeline(model, reverse_label_map, face_index, scale=args.scale, stage_timer=timer,
+                                   motion_gate=not args.no_motion_gate, detector=args.detector,
+                                   adaptive=args.adaptive)
+    attendance_db = MemoryAttendanceDB()
+    writer = AttendanceWriter(attendance_db)
+
+    frames = 0
+    faces = 0
+
+    def record(face_names):
+        with timer.measure("attendance"):
+            for name, person_id, person_type in face_names:
+                if person_id and person_type:
+                    writer.record(0, person_id, "present", person_type)
+
+    start = time.perf_counter()
+    if args.processes != 1:
+        from recognition_workers import RecognitionWorkerPool
+
+        def drain(results):
+            nonlocal frames, faces
+            for _, frame, face_locations, _ in results:
+                with timer.measure("frame"):
+                    if face_locations is None:
+                        # Skipped frame: the display keeps the previous result
+                        face_locations, face_names = pipeline.last_result or ([], [])
+                    else:
+                        face_names = pipeline.identify_faces(frame, face_locations)
+                        pipeline.last_result = face_locations, face_names
+                    record(face_names)
+                frames += 1
+                faces += len(face_locations)
+
+        def skip(frame):
+            if pipeline.last_result is None:
+                return False
+            if pipeline.controller and pipeline.controller.should_skip():
+                return True
+            return pipeline.motion_gate is not None and not pipeline.motion_gate.should_process(frame)
+
+        # Same split as the camera window: workers detect, the tracker decides what is encoded
+        with RecognitionWorkerPool(args.processes, scale=args.scale, encode=False,
+                                   detector=args.detector, controller=pipeline.controller) as pool:
+            pipeline.worker_pool = pool
+            for frame in replay_frames(args.source, args.max_frames, args.paced):
+                queue = pool.skip if skip(frame) else pool.submit
+                while queue(frame) is None:
+                    drain(pool.collect(timeout=0.1))
+                drain(pool.collect(timeout=0))
+            while pool.in_flight:
+                drain(pool.collect(timeout=0.1))
+    else:
+        for frame in replay_frames(args.source, args.max_frames, args.paced):
+            with timer.measure("frame"):
+                face_locations, face_names = pipeline.process(frame)
+                record(face_names)
+            frames += 1
+            faces += len(face_locations)
+    with timer.measure("attendance_flush"):
+        writer.flush()
+    elapsed = time.perf_counter() - start
+
+    if frames == 0:
+        raise ValueError(f"No frames could be read from {args.source}")
+    return {
+        "mode": "recognition",
+        "processes": args.processes,
+        "frames": frames,
+        "faces": faces,
+        "elapsed_s": elapsed,
+        "fps": frames / elapsed,
+        "faces_per_s": faces / elapsed,
+        "attendance_rows": len(attendance_db.rows),
+        "motion_skipped": pipeline.motion_gate.total_skipped if pipeline.motion_gate else 0,
+        "adaptive": pipeline.controller.status() if pipeline.controller else None,
+        "stages": timer.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_training_benchmark(args):
+    from face_encoder import encode_images
+
+    img_paths = list_images(args.source)
+    if args.max_frames:
+        img_paths = img_paths[:args.max_frames]
+    if not img_paths:
+        raise ValueError(f"No images found in {args.source}")
+
+    start = time.perf_counter()
+    encoded = sum(1 for _, encoding in encode_images(img_paths, args.workers, args.chunk_size,
+                                                     known_crop=args.known_crop)
+                  if encoding is not None)
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": "training",
+        "images": len(img_paths),
+        "encoded": encoded,
+        "elapsed_s": elapsed,
+        "images_per_s": len(img_paths) / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    """Return human readable regressions of result against baseline"""
+    regressions = []
+    for key in ("fps", "faces_per_s", "images_per_s"):
+        if baseline.get(key) and result.get(key) is not None and result[key] < baseline[key] * (1 - tolerance):
+            regressions.append(f"{key}: {result[key]:.2f} < baseline {baseline[key]:.2f}")
+
+    for stage, stats in baseline.get("stages", {}).items():
+        current = result.get("stages", {}).get(stage)
+        if not current:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            # Ignore sub-millisecond stages where timer noise dominates
+            if stats[key] >= 1.0 and current[key] > stats[key] * (1 + tolerance):
+                regressions.append(f"{stage} {key}: {current[key]:.2f} > baseline {stats[key]:.2f}")
+    return regressions
+
+
+def print_report(result):
+    print(f"Mode: {result['mode']}  elapsed: {result['elapsed_s']:.2f}s")
+    for key in ("frames", "faces", "fps", "faces_per_s", "images", "encoded", "images_per_s", "attendance_rows",
+                "motion_skipped"):
+        if key in result:
+            value = result[key]
+            print(f"  {key:16} {value:.2f}" if isinstance(value, float) else f"  {key:16} {value}")
+    for stage, stats in sorted(result.get("stages", {}).items()):
+        print(f"  {stage:16} n={stats['count']:<6} p50={stats['p50_ms']:8.2f}ms "
+              f"p90={stats['p90_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms")
+    if result.get("adaptive"):
+        adaptive = result["adaptive"]
+        print(f"  adaptive         scale={adaptive['scale']} stride={adaptive['stride']}")
+    if result.get("peak_rss_mb") is not None:
+        print(f"  peak RSS         {result['peak_rss_mb']:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the face recognition pipeline without camera or database")
+    parser.add_argument("source", help="Video file or image folder to replay")
+    parser.add_argument("--mode", choices=("recognition", "training"), default="recognition")
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames or images")
+    parser.add_argument("--paced", action="store_true", help="Replay recordings at their real frame rate")
+    parser.add_argument("--scale", type=float, default=DETECTION_SCALE, help="Detection downscale factor")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Let the adaptive controller tune scale and stride (starting from --scale)")
+    parser.add_argument("--detector", choices=DETECTOR_BACKENDS, default=DETECTOR_BACKEND,
+                        help="Face detector backend in recognition mode")
+    parser.add_argument("--no-motion-gate", action="store_true", help="Run detection on every frame")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Detection/encoding processes in recognition mode (0 = all cores, 1 = in-thread)")
+    parser.add_argument("--workers", type=int, default=1, help="Encoding processes in training mode (0 = all cores)")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--known-crop", action="store_true", help="Skip detection on dataset crops in training mode")
+    parser.add_argument("--output", help="Write the result as JSON to this file")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.mode == "training":
+        result = run_training_benchmark(args)
+    else:
+        result = run_recognition_benchmark(args)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        if args.save_baseline or not os.path.exists(args.baseline):
+            with open(args.baseline, "w") as f:
+                json.dump(result, f, indent=2)
+            print(f"Baseline saved to {args.baseline}")
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("mode") != result["mode"]:
+            print(f"Baseline mode {baseline.get('mode')} does not match {result['mode']}")
+            return 2
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regression against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
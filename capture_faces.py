@@ -1,6 +1,5 @@
 import threading
 import time
-import face_recognition
 import customtkinter as ctk
 import tkinter
 import cv2
@@ -9,7 +8,6 @@ import re
 import queue
 import logging
 import joblib
-import numpy as np
 import pickle
 from PIL import Image
 from tkinter import messagebox
@@ -17,15 +15,31 @@ from database import TeacherDB, StudentDB
 from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 from sklearn.svm import SVC
+from face_index import build_index, save_index
+from frame_source import open_frame_source
+from encoding_cache import EncodingCache
+from face_encoder import encode_images, encode_faces, resolve_workers
+from face_detector import create_detector
+from image_writer import ImageWriter
+from sample_selector import SampleSelector
+from person_embeddings import save_person_embeddings, load_person_embeddings, dataset_person, store_is_stale, image_stamps
+from embedding_store import EmbeddingStore
+from model_update import enroll_person
+from recognition_pipeline import create_controller, scale_locations
 from config import DATASET_PATH, TOTAL_IMAGES, IMG_SIZE, UI_CONFIG,Theme
+from config import MODEL_PATH, LABEL_MAP_PATH, FACE_INDEX_PATH, INDEX_BACKEND, INDEX_PARTITION_THRESHOLD, ENCODING_CACHE_PATH
+from config import TRAINING_WORKERS, TRAINING_CHUNK_SIZE, TRAINING_KNOWN_CROP, CAPTURE_DETECTION_SCALE
+from config import CAPTURE_WRITER_WORKERS, CAPTURE_WRITER_QUEUE, CAPTURE_MAX_WRITE_ERRORS, SAMPLE_SELECTION_ENABLED
+from config import EMBEDDING_STORE_PATH
 
 
 logging.basicConfig(filename='capture_faces.log', level=logging.DEBUG,
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
 class Camera:
-    def __init__(self, camera_index=0, resolution=(400, 400), fps=60):
+    def __init__(self, camera_index=0, resolution=(400, 400), fps=60, source=None):
         self.camera_index = camera_index
+        self.source = source
         self.resolution = resolution
         self.fps = fps
         self.cap = None
@@ -42,15 +56,16 @@ class Camera:
 
     def start(self):
         try:
-            self.cap = cv2.VideoCapture(self.camera_index, cv2.CAP_DSHOW)
-            if not self.cap.isOpened():
-                logging.error(f"Failed to open camera at index {self.camera_index}")
+            self.cap = open_frame_source(
+                self.camera_index if self.source is None else self.source,
+                resolution=self.resolution,
+                fps=self.fps
+            )
+            if not self.cap.open():
+                logging.error(f"Failed to open frame source {self.cap}")
                 return False
 
             with self.lock:
-                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
-                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
-                self.cap.set(cv2.CAP_PROP_FPS, self.fps)
                 self._is_opened = True
                 self.is_running = True
 
@@ -64,13 +79,17 @@ class Camera:
 
     def _capture_frames(self):
         frame_interval = 1.0 / self.fps
-        while self.is_running and self.cap and self.cap.isOpened():
+        while self.is_running and self.cap and self.cap.is_opened:
             try:
                 start_time = time.time()
                 with self.lock:
                     ret, frame = self.cap.read()
                 if not ret:
-                    logging.warning("Failed to capture frame")
+                    if self.cap.is_live:
+                        logging.warning("Failed to capture frame")
+                        time.sleep(0.01)
+                        continue
+                    logging.info(f"Frame source {self.cap} exhausted")
                     break
                 frame = cv2.resize(frame, self.resolution)
                 self.current_frame = frame.copy()
@@ -115,6 +134,13 @@ class CaptureFaces(ctk.CTkFrame):
         self.face_detection_thread = None
         self.face_queue = queue.Queue(maxsize=5)
         self.images_captured = 0
+        self.samples_submitted = 0
+        self.write_errors = 0
+        self.image_writer = None
+        self.sample_selector = None
+        self.capture_hint = None
+        self.pending_encodings = {}
+        self.capture_encodings = {}
         self.current_student = None
         self.current_teacher = None
         self.db_connection = db_connection
@@ -601,6 +627,14 @@ class CaptureFaces(ctk.CTkFrame):
         self.progress_bar.set(0)
 
         self.images_captured = 0
+        self.samples_submitted = 0
+        self.write_errors = 0
+        self.pending_encodings = {}
+        self.capture_encodings = {}
+        self.image_writer = ImageWriter(CAPTURE_WRITER_WORKERS, CAPTURE_WRITER_QUEUE, on_complete=self.on_sample_written)
+        self.image_writer.start()
+        self.sample_selector = SampleSelector() if SAMPLE_SELECTION_ENABLED else None
+        self.capture_hint = None
         self.is_capturing = True
 
         self.face_detection_thread = threading.Thread(target=self.detect_faces, daemon=True)
@@ -608,7 +642,9 @@ class CaptureFaces(ctk.CTkFrame):
         self.update_camera_feed()
 
     def detect_faces(self):
-        scale_factor = 0.5
+        detector = create_detector()
+        controller = create_controller(CAPTURE_DETECTION_SCALE)
+        selector = self.sample_selector
         while self.is_capturing and self.camera and self.camera.is_opened:
             try:
                 frame = self.camera.get_frame()
@@ -616,14 +652,15 @@ class CaptureFaces(ctk.CTkFrame):
                     time.sleep(0.05)
                     continue
 
+                start = time.perf_counter()
+                scale_factor = controller.scale
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 small_frame = cv2.resize(rgb_frame, (0, 0), fx=scale_factor, fy=scale_factor)
-                face_locations = face_recognition.face_locations(small_frame, model="hog")
-                face_locations = [
-                    (int(top / scale_factor), int(right / scale_factor), int(bottom / scale_factor), int(left / scale_factor))
-                    for top, right, bottom, left in face_locations
-                ]
+                face_locations = scale_locations(detector.detect(small_frame), scale_factor)
+                controller.record(time.perf_counter() - start, len(face_locations))
 
+                # Crop samples before the preview draws on the frame
+                self._collect_samples(rgb_frame, face_locations, selector)
                 if not self.face_queue.full():
                     self.face_queue.put((rgb_frame, face_locations))
             except Exception as e:
@@ -631,6 +668,46 @@ class CaptureFaces(ctk.CTkFrame):
                 if not self.face_queue.full():
                     self.face_queue.put((None, []))
             time.sleep(0.05)
+        if selector is not None:
+            logging.info(f"Capture samples rejected: {selector.rejected}")
+
+    def _collect_samples(self, rgb_frame, face_locations, selector):
+        """Hand the faces worth keeping to the image writer, on the detection thread"""
+        writer = self.image_writer
+        for top, right, bottom, left in face_locations:
+            # Failed writes are replaced by later samples
+            if writer is None or self.samples_submitted - self.write_errors >= TOTAL_IMAGES:
+                return
+            if right - left < 50 or bottom - top < 50:
+                continue
+
+            if selector is not None:
+                sample = selector.evaluate(rgb_frame, (top, right, bottom, left))
+                if sample is None:
+                    continue
+                face_img, encoding = sample
+            else:
+                face_img = rgb_frame[top:bottom, left:right]
+                if face_img.size == 0:
+                    continue
+                face_img = cv2.resize(face_img, (IMG_SIZE, IMG_SIZE))
+                encoding = self._encode_sample(rgb_frame, (top, right, bottom, left))
+
+            img_path = os.path.join(self.dataset_dir, f"{self.samples_submitted}.jpg")
+            if encoding is not None:
+                self.pending_encodings[img_path] = encoding
+            if writer.submit(img_path, face_img, conversion=cv2.COLOR_RGB2BGR):
+                self.samples_submitted += 1
+            else:
+                self.pending_encodings.pop(img_path, None)
+
+    def _encode_sample(self, rgb_frame, location):
+        """Encoding from the full camera frame; None leaves it to training"""
+        try:
+            return encode_faces(rgb_frame, [location])[0]
+        except Exception as e:
+            logging.error(f"Error encoding captured face: {e}")
+            return None
 
     def update_camera_feed(self):
         if not self.is_capturing or not self.camera or not self.camera.is_opened:
@@ -645,6 +722,12 @@ class CaptureFaces(ctk.CTkFrame):
             self.after(33, self.update_camera_feed)  # ~30 FPS
             return
 
+        # Completed writes update the progress bar and may finish or abort the capture
+        self.image_writer.dispatch()
+        if not self.is_capturing:
+            return
+
+        self._show_capture_hint()
         if rgb_frame is None:
             self.after(33, self.update_camera_feed)
             return
@@ -656,30 +739,6 @@ class CaptureFaces(ctk.CTkFrame):
                 continue
             cv2.rectangle(rgb_frame, (left, top), (right, bottom), (0, 255, 0), 2)
 
-            if self.images_captured < TOTAL_IMAGES:
-                face_img = rgb_frame[top:bottom, left:right]
-                if face_img.size == 0:
-                    continue
-                face_img = cv2.resize(face_img, (IMG_SIZE, IMG_SIZE))
-                img_path = os.path.join(self.dataset_dir, f"{self.images_captured}.jpg")
-                face_img_bgr = cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR)
-                try:
-                    cv2.imwrite(img_path, face_img_bgr)
-                    self.images_captured += 1
-                    progress = self.images_captured / TOTAL_IMAGES
-                    self.progress_bar.set(progress)
-                    self.progress_label.configure(text=f"Captured {self.images_captured}/{TOTAL_IMAGES} images")
-
-                    if self.images_captured >= TOTAL_IMAGES:
-                        self.is_capturing = False
-                        self.reset_capture_state()
-                        self.progress_label.configure(text="Capture complete")
-                        self.update_database_with_photo()
-                        messagebox.showinfo("Success", f"Successfully captured {TOTAL_IMAGES} images and updated database")
-                        return
-                except Exception as e:
-                    logging.error(f"Error saving image: {e}")
-
         preview_size = UI_CONFIG['preview_size']
         img = Image.fromarray(rgb_frame)
         img = img.resize(preview_size, Image.Resampling.LANCZOS)
@@ -690,6 +749,65 @@ class CaptureFaces(ctk.CTkFrame):
         if self.is_capturing:
             self.after(33, self.update_camera_feed)
 
+    def _capture_status(self):
+        status = f"Captured {self.images_captured}/{TOTAL_IMAGES} images"
+        return f"{status} - {self.capture_hint}" if self.capture_hint else status
+
+    def _show_capture_hint(self):
+        """Tell the person why their recent samples were rejected"""
+        hint = self.sample_selector.hint if self.sample_selector else None
+        if hint != self.capture_hint:
+            self.capture_hint = hint
+            self.progress_label.configure(text=self._capture_status())
+
+    def on_sample_written(self, img_path, error):
+        if not self.is_capturing:
+            return
+        encoding = self.pending_encodings.pop(img_path, None)
+        if error is not None:
+            self.write_errors += 1
+            if self.write_errors >= CAPTURE_MAX_WRITE_ERRORS:
+                self.reset_capture_state()
+                self.progress_label.configure(text="Capture failed")
+                messagebox.showerror("Capture Error", f"Failed to save captured images: {str(error)}")
+            return
+
+        if encoding is not None:
+            self.capture_encodings[os.path.basename(img_path)] = encoding
+            # Only samples on disk block near duplicates
+            if self.sample_selector is not None:
+                self.sample_selector.keep(encoding)
+        self.images_captured += 1
+        progress = self.images_captured / TOTAL_IMAGES
+        self.progress_bar.set(progress)
+        self.progress_label.configure(text=self._capture_status())
+
+        if self.images_captured >= TOTAL_IMAGES:
+            self.reset_capture_state()
+            self.progress_label.configure(text="Capture complete")
+            threading.Thread(target=self._save_capture_encodings,
+                             args=(self.dataset_dir, self.person_type.get(), self.capture_encodings), daemon=True).start()
+            self.capture_encodings = {}
+            self.update_database_with_photo()
+            messagebox.showinfo("Success", f"Successfully captured {TOTAL_IMAGES} images and updated database")
+
+    def _save_capture_encodings(self, person_dir, person_type, encodings):
+        try:
+            save_person_embeddings(person_dir, encodings)
+            key, info = dataset_person(person_type, os.path.basename(person_dir))
+            names = sorted(encodings)
+            stamps = image_stamps(person_dir)
+            files = {name: stamps[name] for name in names if name in stamps}
+            # Recognisable right away, without retraining
+            if enroll_person(key, info, names, [encodings[name] for name in names], files) is None:
+                self.after(0, lambda: messagebox.showwarning(
+                    "Training Needed", "The recognition model knows people the embedding store does not. "
+                                       "Train the model so the new person is recognised."))
+                return
+            logging.info(f"Enrolled {key} with {len(encodings)} capture encodings")
+        except Exception as e:
+            logging.error(f"Error saving capture encodings in {person_dir}: {e}")
+
     def cancel_capture(self):
         self.is_capturing = False
         self.reset_capture_state()
@@ -718,6 +836,11 @@ class CaptureFaces(ctk.CTkFrame):
             self.face_detection_thread.join(timeout=1.0)
         self.face_detection_thread = None
 
+        # Writes already queued finish in the background
+        if self.image_writer:
+            self.image_writer.stop(wait=False)
+            self.image_writer = None
+
     def update_database_with_photo(self):
         try:
             if self.person_type.get() == "student":
@@ -752,106 +875,123 @@ class CaptureFaces(ctk.CTkFrame):
             self.close_progress_window()
             messagebox.showerror("Training Error", f"Failed to start training: {str(e)}")
 
+    def _collect_dataset_people(self, person_type):
+        """Return [(store key, folder path, info, image stamps)] for every person folder of a dataset type"""
+        people = []
+        type_path = os.path.join(DATASET_PATH, f"{person_type}s")
+        if not os.path.exists(type_path):
+            return people
+
+        for person_folder in os.listdir(type_path):
+            folder_path = os.path.join(type_path, person_folder)
+            if os.path.isdir(folder_path):
+                key, info = dataset_person(person_type, person_folder)
+                people.append((key, folder_path, info, image_stamps(folder_path)))
+        return people
+
+    def _sync_embedding_store(self, store, people):
+        """Encode the person folders that are new or changed since the store last saw them.
+
+        A folder is stale when any image was added, removed or edited since;
+        people whose folder was deleted leave the store.
+        Capture-time encodings are used where still valid, then the encoding
+        cache, and only the remaining images are decoded and encoded.
+        """
+        cache = EncodingCache(ENCODING_CACHE_PATH, variant="known_crop" if TRAINING_KNOWN_CROP else "hog")
+        # Forget photos deleted from the dataset
+        cache.prune(os.path.join(folder_path, img_name) for _, folder_path, _, stamps in people for img_name in stamps)
+
+        changed = [person for person in people if store_is_stale(store, person[0], person[3])]
+        # Folders deleted from the dataset
+        removed = {person["key"] for person in store.people} - {key for key, *_ in people}
+        if not changed:
+            self._save_encoding_cache(cache)
+            if removed:
+                store.update(removed=removed)
+            return 0
+
+        jobs = []
+        captured = {}
+        for key, folder_path, info, stamps in changed:
+            captured.update(load_person_embeddings(folder_path))
+            jobs.extend((os.path.join(folder_path, img_name), key) for img_name in sorted(stamps))
+        total_images = len(jobs)
+
+        cached = {}
+        pending = []
+        for img_path, _ in jobs:
+            # Encoded at capture time from the full camera frame
+            if img_path in captured:
+                cached[img_path] = captured[img_path]
+                continue
+            hit, encoding = cache.get(img_path)
+            if hit:
+                cached[img_path] = encoding
+            else:
+                pending.append(img_path)
+
+        def report_progress(done, total):
+            processed_images = len(cached) + done
+            progress = 0.1 + (processed_images / total_images) * 0.4
+            self.update_training_progress(progress, f"Processing image {processed_images}/{total_images}")
+
+        workers = resolve_workers(TRAINING_WORKERS)
+        logging.info(f"Encoding {len(pending)} new images with {workers} worker(s), {len(cached)} cached "
+                     f"({len(captured)} from capture)")
+        for img_path, encoding in encode_images(pending, workers, TRAINING_CHUNK_SIZE, report_progress,
+                                                 known_crop=TRAINING_KNOWN_CROP):
+            cache.put(img_path, encoding)
+            cached[img_path] = encoding
+
+        samples = {key: ([], []) for key, _, _, _ in changed}
+        for img_path, key in jobs:
+            encoding = cached.get(img_path)
+            if encoding is not None:
+                samples[key][0].append(os.path.basename(img_path))
+                samples[key][1].append(encoding)
+            else:
+                logging.warning(f"No faces detected in {img_path}")
+
+        self._save_encoding_cache(cache)
+        store.update(((key, info, *samples[key], stamps) for key, _, info, stamps in changed), removed=removed)
+        return total_images
+
+    def _save_encoding_cache(self, cache):
+        try:
+            cache.save()
+            logging.info(f"Encoding cache: {cache.hits} reused, {cache.misses} encoded")
+        except Exception as e:
+            logging.error(f"Error saving encoding cache: {e}")
+
     def _train_model_thread(self):
         try:
-            encodings = []
-            labels = []
-            label_map = {}
-            reverse_label_map = {}
-            label_id = 0
-            total_images = 0
-
-            students_path = os.path.join(DATASET_PATH, "students")
-            if os.path.exists(students_path):
-                for student_folder in os.listdir(students_path):
-                    folder_path = os.path.join(students_path, student_folder)
-                    if os.path.isdir(folder_path):
-                        total_images += len([f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
-
-            teachers_path = os.path.join(DATASET_PATH, "teachers")
-            if os.path.exists(teachers_path):
-                for teacher_folder in os.listdir(teachers_path):
-                    folder_path = os.path.join(teachers_path, teacher_folder)
-                    if os.path.isdir(folder_path):
-                        total_images += len([f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
-
-            if total_images == 0:
+            people = self._collect_dataset_people("student") + self._collect_dataset_people("teacher")
+            self.update_training_progress(0.1, "Updating embedding store...")
+            store = EmbeddingStore(EMBEDDING_STORE_PATH)
+            synced = self._sync_embedding_store(store, people)
+            logging.info(f"Embedding store: {len(store.people)} people, {len(store)} samples, "
+                         f"{synced} images re-encoded")
+
+            if not store.people:
                 self.after(0, lambda: self.close_progress_window())
                 self.after(0, lambda: messagebox.showwarning("Training Error", "No images found for training."))
                 return
 
-            processed_images = 0
-            self.update_training_progress(0.1, "Processing student images...")
-            if os.path.exists(students_path):
-                for student_folder in os.listdir(students_path):
-                    folder_path = os.path.join(students_path, student_folder)
-                    if os.path.isdir(folder_path):
-                        try:
-                            student_id, student_name = student_folder.split('_', 1)
-                        except ValueError:
-                            student_id = student_folder
-                            student_name = "Unknown"
-
-                        label_map[student_folder] = label_id
-                        reverse_label_map[label_id] = {"student_id": student_id, "name": student_name, "type": "student"}
-
-                        for img_name in os.listdir(folder_path):
-                            if img_name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                                img_path = os.path.join(folder_path, img_name)
-                                img = face_recognition.load_image_file(img_path)
-                                face_encodings = face_recognition.face_encodings(img, model="hog")
-                                if face_encodings:
-                                    encodings.append(face_encodings[0])
-                                    labels.append(label_id)
-                                else:
-                                    logging.warning(f"No faces detected in {img_path}")
-                                processed_images += 1
-                                progress = 0.1 + (processed_images / total_images) * 0.4
-                                self.update_training_progress(progress, f"Processing image {processed_images}/{total_images}")
-                        label_id += 1
-
-            self.update_training_progress(0.5, "Processing teacher images...")
-            if os.path.exists(teachers_path):
-                for teacher_folder in os.listdir(teachers_path):
-                    folder_path = os.path.join(teachers_path, teacher_folder)
-                    if os.path.isdir(folder_path):
-                        try:
-                            teacher_id, teacher_name = teacher_folder.split('_', 1)
-                        except ValueError:
-                            teacher_id = teacher_folder
-                            teacher_name = "Unknown"
-
-                        label_map[teacher_folder] = label_id
-                        reverse_label_map[label_id] = {"user_id": teacher_id, "name": teacher_name, "type": "teacher"}
-
-                        for img_name in os.listdir(folder_path):
-                            if img_name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                                img_path = os.path.join(folder_path, img_name)
-                                img = face_recognition.load_image_file(img_path)
-                                face_encodings = face_recognition.face_encodings(img, model="hog")
-                                if face_encodings:
-                                    encodings.append(face_encodings[0])
-                                    labels.append(label_id)
-                                else:
-                                    logging.warning(f"No faces detected in {img_path}")
-                                processed_images += 1
-                                progress = 0.1 + (processed_images / total_images) * 0.4
-                                self.update_training_progress(progress, f"Processing image {processed_images}/{total_images}")
-                        label_id += 1
-
-            if not encodings:
+            if len(store) == 0:
                 self.after(0, lambda: self.close_progress_window())
                 self.after(0, lambda: messagebox.showwarning("Training Error", "No valid face data found for training."))
                 return
 
+            labels, reverse_label_map = store.labels()
             if len(set(labels)) < 2:
                 self.after(0, lambda: self.close_progress_window())
                 self.after(0, lambda: messagebox.showwarning("Training Error", "Need at least 2 different people with faces detected."))
                 return
 
             self.update_training_progress(0.6, "Preparing data for training...")
-            X = np.array(encodings)
-            y = np.array(labels)
+            # Memory-mapped rows of the store, read without a copy
+            X = store.matrix
+            y = labels
 
             self.update_training_progress(0.7, "Splitting data...")
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -864,15 +1004,16 @@ class CaptureFaces(ctk.CTkFrame):
             y_pred = svm.predict(X_test)
             accuracy = accuracy_score(y_test, y_pred)
 
+            self.update_training_progress(0.93, "Building face index...")
+            face_index = build_index(X, y, backend=INDEX_BACKEND, partition_threshold=INDEX_PARTITION_THRESHOLD)
+
             self.update_training_progress(0.95, "Saving model...")
             os.makedirs("models", exist_ok=True)
-            model_path = os.path.join("models", "face_recognition_svm.pkl")
-            label_map_path = os.path.join("models", "label_map.pickle")
-
             try:
-                joblib.dump(svm, model_path)
-                with open(label_map_path, "wb") as f:
+                joblib.dump(svm, MODEL_PATH)
+                with open(LABEL_MAP_PATH, "wb") as f:
                     pickle.dump(reverse_label_map, f)
+                save_index(face_index, FACE_INDEX_PATH)
             except Exception as e:
                 logging.error(f"Error saving model or label map: {e}")
                 self.after(0, lambda: self.close_progress_window())
@@ -882,7 +1023,7 @@ class CaptureFaces(ctk.CTkFrame):
             self.update_training_progress(1.0, "Training complete!")
             time.sleep(0.5)
             self.after(0, lambda: self.close_progress_window())
-            self.after(0, lambda: messagebox.showinfo("Training Complete", f"Model trained successfully!\nTest Accuracy: {accuracy:.2f}\nSamples: {len(encodings)}"))
+            self.after(0, lambda: messagebox.showinfo("Training Complete", f"Model trained successfully!\nTest Accuracy: {accuracy:.2f}\nSamples: {len(X)}"))
         except Exception as e:
             logging.error(f"Training error: {e}")
             self.after(0, lambda: self.close_progress_window())
@@ -1,7 +1,5 @@
 import os
 
-import customtkinter as ctk
-
 # Base directory configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -23,10 +21,82 @@ UI_CONFIG = {
     }
 }
 TOTAL_IMAGES = 50
+CAPTURE_WRITER_WORKERS = 2  # Background threads saving captured samples
+CAPTURE_WRITER_QUEUE = 16  # Samples waiting to be written before new ones are dropped
+CAPTURE_MAX_WRITE_ERRORS = 5  # Failed writes before a capture is aborted
+
+# Enrolment sample selection, measured on the IMG_SIZE crop
+SAMPLE_SELECTION_ENABLED = True
+SAMPLE_MIN_SHARPNESS = 60.0  # Minimum variance of the Laplacian; lower is blurred
+SAMPLE_BRIGHTNESS_RANGE = (50, 210)  # Accepted mean gray level
+SAMPLE_MIN_CONTRAST = 20.0  # Minimum gray level standard deviation
+SAMPLE_MAX_YAW = 0.35  # Nose offset from the eye midpoint, relative to eye distance
+SAMPLE_MAX_ROLL = 20.0  # Degrees of head tilt
+SAMPLE_MIN_DISTANCE = 0.12  # Minimum embedding distance to every kept sample
+SAMPLE_PATIENCE = 30  # Rejections for one reason before that check is relaxed
+
+# Database configuration
+DB_POOL_SIZE = 8  # Pooled MySQL connections shared by all threads
+DB_HEALTH_CHECK_INTERVAL = 30  # Seconds before a thread's connection is pinged again
+DB_POOL_TIMEOUT = 10  # Seconds to wait for a free pooled connection before giving up
+
+# Recognition configuration
+CAMERA_SOURCE = 0  # Camera index, video file, image folder or stream URL used for recognition
+MODEL_PATH = os.path.join('models', 'face_recognition_svm.pkl')
+LABEL_MAP_PATH = os.path.join('models', 'label_map.pickle')
+FACE_INDEX_PATH = os.path.join('models', 'face_index.pickle')
+INDEX_BACKEND = 'auto'  # 'brute', 'partitioned' or 'auto'
+INDEX_PARTITION_THRESHOLD = 2000  # Samples above which 'auto' switches to the partitioned index
+RECOGNITION_TOLERANCE = 0.6  # Maximum embedding distance accepted as a match
+ENCODING_CHIP_PADDING = 0.25  # Context kept around each face in the aligned 150x150 encoder chip
+DETECTOR_BACKEND = 'hog'  # 'hog' (accurate), 'haar' (fast) or 'cascade' (Haar proposals confirmed by HOG)
+HAAR_CASCADE_PATH = os.path.join(BASE_DIR, 'haarcascade_frontalface_default.xml')
+DETECTION_SCALE = 0.25  # Initial downscale factor of frames before face detection
+CAPTURE_DETECTION_SCALE = 0.5  # Initial downscale factor while capturing training faces
+ADAPTIVE_CONTROL_ENABLED = True  # Adapt detection scale and frame stride to TARGET_FRAME_LATENCY
+TARGET_FRAME_LATENCY = 0.1  # Seconds of processing per recognised frame the controller aims for
+MIN_DETECTION_SCALE = 0.15
+MAX_DETECTION_SCALE = 0.5
+MAX_FRAME_STRIDE = 4  # Recognise at most one frame in this many when the machine is overloaded
+RECOGNITION_PROCESSES = 0  # Detection/encoding processes for the camera window and room scheduler, 0 = one per CPU core, 1 = in-thread
+MOTION_GATE_ENABLED = True  # Reuse the previous detections while the scene does not change
+MOTION_THRESHOLD = 0.01  # Fraction of changed pixels that counts as motion
+MOTION_PIXEL_DELTA = 25  # Gray level difference for a pixel to count as changed
+MOTION_HEARTBEAT = 15  # Frames after which a full detection pass is forced anyway
+
+# Tracking configuration
+TRACKER_IOU_THRESHOLD = 0.3  # Minimum box overlap to continue a track
+TRACKER_REIDENTIFY_INTERVAL = 30  # Frames before a confident track is identified again
+TRACKER_RETRY_INTERVAL = 3  # Frames before an unknown or weak track is identified again
+TRACKER_MAX_MISSED = 5  # Frames a track survives without a matching detection
+TRACKER_CONFIDENT_DISTANCE = 0.5  # Embedding distance under which a match is trusted
+
+# Multi-room configuration
+ROOM_CAMERAS = {}  # Seance location -> frame source (camera index, stream URL, ...) for the scheduler
+RECOGNITION_WORKERS = 2  # Frames recognised concurrently across all cameras
+CAMERA_FRAME_BUDGET = 5.0  # Frames per second recognised per camera, 0 = as many as possible
+SEANCE_POLL_INTERVAL = 30  # Seconds between checks for started and ended seances
+SCHEDULER_ERROR_BACKOFF = 5  # Seconds the room scheduler waits after an error, e.g. a lost database
+
+ENCODING_BATCH_SIZE = 64  # Faces from all cameras encoded in one network call
+ENCODING_BATCH_DELAY = 0.01  # Seconds a frame's faces may wait for a fuller batch
+
+# Attendance configuration
+ATTENDANCE_FLUSH_INTERVAL = 2.0  # Seconds between batched attendance writes
+ATTENDANCE_FLUSH_SIZE = 50  # Pending records that trigger an early flush
+
+# Training configuration
+ENCODING_CACHE_PATH = os.path.join('models', 'encoding_cache.pickle')
+EMBEDDING_STORE_PATH = os.path.join('models', 'embeddings')  # Training input, one row per sample
+TRAINING_WORKERS = 0  # Encoding processes used for training, 0 = one per CPU core
+TRAINING_CHUNK_SIZE = 16  # Images sent to a worker process at a time
+TRAINING_KNOWN_CROP = True  # Dataset images are face crops: skip HOG re-detection when encoding
 
 class Theme:
     def set_application_theme(self):
         """Set the application-wide theme using lavender.json and custom styles"""
+        # Imported here so the settings above load without a Tk installation
+        import customtkinter as ctk
         # Set global customtkinter theme
         ctk.set_default_color_theme("lavender.json")  # Apply lavender theme
         self.theme = {
@@ -0,0 +1 @@
+# Lets pytest import the root modules from tests/
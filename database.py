@@ -1,45 +1,178 @@
-import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
 from tkinter import messagebox
+from contextlib import contextmanager
+from datetime import datetime
 import hashlib
+import threading
+import time
+from roster_cache import notify_enrolment_change
+from model_update import remove_enrolled
+from config import DB_POOL_SIZE, DB_HEALTH_CHECK_INTERVAL, DB_POOL_TIMEOUT
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
 class DatabaseConnection:
-    def __init__(self, host="localhost", user="root", password="", database="student_management"):
+    """Thread-aware access to a shared MySQL connection pool.
+
+    Every thread transparently checks out its own pooled connection through
+    the `connection` property, so the Tk thread, the recognition threads and
+    background writers never share a socket.
+    """
+
+    def __init__(self, host="localhost", user="root", password="", database="student_management",
+                 pool_size=DB_POOL_SIZE, interactive=True):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
-        self.connection = None
+        self.pool_size = pool_size
+        self.interactive = interactive  # False when running without a display
+        self.pool = None
+        self._connections = {}
+        self._lock = threading.Lock()
 
     @staticmethod
     def _hash_password(password):
         return hashlib.sha256(password.encode()).hexdigest()
 
+    def _get_pool(self):
+        # One pool per server/database shared by every DatabaseConnection of the process
+        key = (self.host, self.user, self.password, self.database)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = pooling.MySQLConnectionPool(
+                    pool_name=f"attendance_{len(_pools)}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    host=self.host,
+                    user=self.user,
+                    password=self.password,
+                    database=self.database
+                )
+            return _pools[key]
+
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            if self.connection.is_connected():
-                return self.connection
+            self.pool = self._get_pool()
+            connection = self._checkout()
+            if connection.is_connected():
+                return connection
             return False
         except Error as e:
             print("Error while connecting to MySQL", e)
-            messagebox.showerror("Database Error", f"Failed to connect to database:\n{e}")
+            if self.interactive:
+                messagebox.showerror("Database Error", f"Failed to connect to database:\n{e}")
             return False
 
+    def _reclaim_dead_threads(self):
+        alive = {thread.ident for thread in threading.enumerate()}
+        with self._lock:
+            dead = [thread_id for thread_id in self._connections if thread_id not in alive]
+            connections = [self._connections.pop(thread_id)[0] for thread_id in dead]
+        for connection in connections:
+            self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            # Closing a pooled connection hands it back to the pool
+            connection.close()
+        except Error as e:
+            print(f"Error returning connection to pool: {e}")
+
+    def _checkout(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            entry = self._connections.get(thread_id)
+
+        if entry is not None:
+            connection, last_checked = entry
+            if time.monotonic() - last_checked < DB_HEALTH_CHECK_INTERVAL:
+                return connection
+            try:
+                connection.ping(reconnect=True, attempts=3, delay=1)
+                with self._lock:
+                    self._connections[thread_id] = (connection, time.monotonic())
+                return connection
+            except Error as e:
+                print(f"Pooled connection lost, checking out a new one: {e}")
+                self.release()
+
+        connection = self._get_pooled_connection()
+        cursor = connection.cursor()
+        try:
+            # Long-lived per-thread connections must see rows committed by other threads
+            cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        finally:
+            cursor.close()
+        with self._lock:
+            self._connections[thread_id] = (connection, time.monotonic())
+        return connection
+
+    def _get_pooled_connection(self):
+        # The pool raises at once when it is empty; wait a while for another thread to hand one back
+        deadline = time.monotonic() + DB_POOL_TIMEOUT
+        while True:
+            self._reclaim_dead_threads()
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    @property
+    def connection(self):
+        """Pooled connection owned by the calling thread"""
+        if self.pool is None:
+            return None
+        return self._checkout()
+
+    @contextmanager
+    def cursor(self, dictionary=False):
+        """Yield a cursor on the calling thread's connection, committing on success"""
+        connection = self.connection
+        if connection is None:
+            raise ConnectionError("Database not connected")
+        cursor = connection.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def release(self):
+        """Return the calling thread's connection to the pool"""
+        with self._lock:
+            entry = self._connections.pop(threading.get_ident(), None)
+        if entry is not None:
+            self._close_quietly(entry[0])
+
     def disconnect(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        with self._lock:
+            connections = [connection for connection, _ in self._connections.values()]
+            self._connections.clear()
+        for connection in connections:
+            self._close_quietly(connection)
+        if connections:
             print("Database connection closed")
 
     def get_connection(self):
-        return self.connection if self.connection and self.connection.is_connected() else None
+        try:
+            return self.connection
+        except Error as e:
+            print(f"Error getting pooled connection: {e}")
+            return None
 
     def is_connected(self):
-        return self.connection and self.connection.is_connected()
+        # Checkout pings the server at most every DB_HEALTH_CHECK_INTERVAL seconds
+        return self.get_connection() is not None
 class AuthDB:
     def __init__(self, db_connection):
         self.db = db_connection
@@ -177,6 +310,7 @@ class TeacherDB:
             """
             cursor.execute(teacher_query, (user_id, cin, name, email, number, specialization, hire_date, photo))
             self.db.connection.commit()
+            notify_enrolment_change("teacher", user_id)
             return user_id
         except Error as e:
             print(f"Error adding teacher: {e}")
@@ -261,6 +395,16 @@ class TeacherDB:
         finally:
             if cursor:
                 cursor.close()
+    def get_teacher_ids(self):
+        if not self.db.is_connected():
+            return []
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute("SELECT user_id FROM teachers")
+                return [row[0] for row in cursor.fetchall()]
+        except Error as e:
+            print(f"Error fetching teacher ids: {e}")
+            return []
     def remove_teacher(self, teacher_id):
         if not self.db.is_connected():
             return False
@@ -274,6 +418,8 @@ class TeacherDB:
             cursor.execute("DELETE FROM users WHERE user_id = %s", (teacher_id,))
             print(f"Deleted from users: {cursor.rowcount}")
             self.db.connection.commit()
+            notify_enrolment_change("teacher", teacher_id, enrolled=False)
+            self._remove_from_model(teacher_id)
             return True
         except Error as e:
             print(f"Error deleting teacher: {e}")
@@ -282,6 +428,12 @@ class TeacherDB:
         finally:
             if cursor:
                 cursor.close()
+
+    def _remove_from_model(self, teacher_id):
+        try:
+            remove_enrolled("teacher", teacher_id)
+        except Exception as e:
+            print(f"Error removing teacher from the recognition model: {e}")
 class StudentDB:
     def __init__(self, db_connection):
         self.db = db_connection
@@ -299,6 +451,7 @@ class StudentDB:
             """
             cursor.execute(query, (full_name, number, email, enrollment_date, photo))
             self.db.connection.commit()
+            notify_enrolment_change("student", cursor.lastrowid)
             return cursor.lastrowid
         except Error as e:
             self.db.connection.rollback()
@@ -323,6 +476,17 @@ class StudentDB:
             if cursor:
                 cursor.close()
 
+    def get_student_ids(self):
+        if not self.db.is_connected():
+            raise ConnectionError("Database not connected")
+
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute("SELECT student_id FROM students")
+                return [row[0] for row in cursor.fetchall()]
+        except Error as e:
+            raise Exception(f"Error fetching student ids: {e}")
+
     def remove_student(self, student_id):
         if not self.db.is_connected():
             raise ConnectionError("Database not connected")
@@ -333,7 +497,11 @@ class StudentDB:
             query = "DELETE FROM students WHERE student_id = %s"
             cursor.execute(query, (student_id,))
             self.db.connection.commit()
-            return cursor.rowcount > 0
+            notify_enrolment_change("student", student_id, enrolled=False)
+            deleted = cursor.rowcount > 0
+            if deleted:
+                self._remove_from_model(student_id)
+            return deleted
         except Error as e:
             self.db.connection.rollback()
             raise Exception(f"Error deleting student: {e}")
@@ -341,6 +509,12 @@ class StudentDB:
             if cursor:
                 cursor.close()
 
+    def _remove_from_model(self, student_id):
+        try:
+            remove_enrolled("student", student_id)
+        except Exception as e:
+            print(f"Error removing student from the recognition model: {e}")
+
     def update_student(self, student_id, full_name=None, number=None, email=None, enrollment_date=None, photo=None):
         if not self.db.is_connected():
             raise ConnectionError("Database not connected")
@@ -899,60 +1073,151 @@ class SeanceDB:
         finally:
             if cursor:
                 cursor.close()
+
+    def get_seance_by_id(self, seance_id):
+        if not self.db.is_connected():
+            return None
+        try:
+            with self.db.cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT * FROM seances WHERE seance_id = %s", (seance_id,))
+                return cursor.fetchone()
+        except Error as e:
+            print(f"Error fetching seance: {e}")
+            return None
+
+    def get_active_seances(self, at=None):
+        """Return the seances taking place at the given time (now by default)"""
+        if not self.db.is_connected():
+            return []
+        at = at or datetime.now()
+        try:
+            with self.db.cursor(dictionary=True) as cursor:
+                query = """
+                SELECT * FROM seances
+                WHERE date = %s AND start_time <= %s AND end_time > %s
+                ORDER BY start_time
+                """
+                current_time = at.strftime('%H:%M:%S')
+                cursor.execute(query, (at.strftime('%Y-%m-%d'), current_time, current_time))
+                return cursor.fetchall()
+        except Error as e:
+            print(f"Error fetching active seances: {e}")
+            return []
 class AttendanceDB:
     def __init__(self, db_connection):
         self.db = db_connection
 
     def record_attendance(self, seance_id, person_id, status, person_type='student'):
+        return self.record_attendance_batch([(seance_id, person_id, status, person_type)])
+
+    def record_attendance_batch(self, records):
+        """Write (seance_id, person_id, status, person_type) rows in one transaction"""
+        if not records:
+            return True
         if not self.db.is_connected():
             return False
-        cursor = None
+        student_rows = [(seance_id, person_id, status)
+                        for seance_id, person_id, status, person_type in records if person_type == 'student']
+        teacher_rows = [(seance_id, person_id, status)
+                        for seance_id, person_id, status, person_type in records if person_type != 'student']
         try:
-            cursor = self.db.connection.cursor()
-            if person_type == 'student':
-                query = """
-                    INSERT INTO attendance (seance_id, student_id, status)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE status = VALUES(status)
-                """
-            else:  # teacher
-                query = """
-                    INSERT INTO attendance (seance_id, teachers_user_id, status)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE status = VALUES(status)
-                """
-            cursor.execute(query, (seance_id, person_id, status))
-            self.db.connection.commit()
+            with self.db.cursor() as cursor:
+                if student_rows:
+                    cursor.executemany("""
+                        INSERT INTO attendance (seance_id, student_id, status)
+                        VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE status = VALUES(status)
+                    """, student_rows)
+                if teacher_rows:
+                    cursor.executemany("""
+                        INSERT INTO attendance (seance_id, teachers_user_id, status)
+                        VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE status = VALUES(status)
+                    """, teacher_rows)
             return True
         except Error as e:
             print(f"Error recording attendance: {e}")
-            self.db.connection.rollback()
             return False
-        finally:
-            if cursor:
-                cursor.close()
 
     def get_attendance_by_seance(self, seance_id):
         if not self.db.is_connected():
             return []
 
-        cursor = None
         try:
-            cursor = self.db.connection.cursor(dictionary=True)
-            query = """
-                SELECT a.attendance_id, a.status, a.timestamp,
-                       s.student_id, s.full_name
-                FROM attendance a
-                JOIN students s ON a.student_id = s.student_id
-                WHERE a.seance_id = %s
-                ORDER BY s.full_name
-            """
-            cursor.execute(query, (seance_id,))
-            return cursor.fetchall()
+            with self.db.cursor(dictionary=True) as cursor:
+                query = """
+                    SELECT a.attendance_id, a.status, a.timestamp,
+                           s.student_id, s.full_name
+                    FROM attendance a
+                    JOIN students s ON a.student_id = s.student_id
+                    WHERE a.seance_id = %s
+                    ORDER BY s.full_name
+                """
+                cursor.execute(query, (seance_id,))
+                return cursor.fetchall()
         except Error as e:
             print(f"Error getting attendance by seance: {e}")
             return []
-        finally:
-            if cursor:
-                cursor.close()
 
+
+class DashboardDB:
+    def __init__(self, db_connection):
+        self.db = db_connection
+
+    def get_student_dashboard(self, date):
+        """Return one row per student with class, teacher and status for the given date"""
+        if not self.db.is_connected():
+            return []
+
+        try:
+            with self.db.cursor(dictionary=True) as cursor:
+                student_query = """
+                    SELECT s.student_id, s.full_name, s.email, s.photo,
+                           c.class_name, u.name AS teacher_name
+                    FROM students s
+                    LEFT JOIN class_students cs ON cs.id_student_class = s.student_id
+                    LEFT JOIN classes c ON c.class_id = cs.idclass_students
+                    LEFT JOIN teachers_has_classes thc ON thc.classes_class_id = c.class_id
+                    LEFT JOIN users u ON u.user_id = thc.teachers_user_id
+                    ORDER BY s.full_name, s.student_id, c.class_id
+                """
+                cursor.execute(student_query)
+                student_rows = cursor.fetchall()
+
+                status_query = """
+                    SELECT a.student_id, a.status
+                    FROM attendance a
+                    JOIN seances se ON se.seance_id = a.seance_id
+                    WHERE se.date = %s AND a.student_id IS NOT NULL
+                    ORDER BY se.seance_id
+                """
+                cursor.execute(status_query, (date,))
+                statuses = {}
+                for row in cursor.fetchall():
+                    statuses.setdefault(row['student_id'], row['status'])
+
+            dashboard = []
+            seen = set()
+            for row in student_rows:
+                if row['student_id'] in seen:
+                    continue
+                seen.add(row['student_id'])
+                if row['class_name'] is None:
+                    class_name, teacher_name = 'No Class', 'No Teacher Assigned'
+                else:
+                    class_name = row['class_name']
+                    teacher_name = row['teacher_name'] or 'No Teacher Assigned'
+                status = statuses.get(row['student_id'])
+                dashboard.append({
+                    'student_id': row['student_id'],
+                    'full_name': row['full_name'],
+                    'email': row['email'],
+                    'photo': row['photo'],
+                    'class_name': class_name,
+                    'teacher_name': teacher_name,
+                    'status': status.capitalize() if status else 'Absent'
+                })
+            return dashboard
+        except Error as e:
+            print(f"Error fetching student dashboard: {e}")
+            return []
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+_write_lock = threading.Lock()
+
+
+class EmbeddingStore:
+    """Versioned archive of every enrolled person's face encodings.
+
+    The store is a directory holding one float32 matrix per version
+    (encodings-<version>.npy) and index.json, which names the current matrix
+    and gives each person's key, label, info, row offset, sample names and
+    the [mtime_ns, size] of the image files the samples were encoded from.
+    Labels are never reused, so removing one person does not renumber the
+    others and models trained before the change stay consistent. Readers
+    memory-map the matrix, so training and index building work on the file
+    pages directly. A write builds the next version beside the current one
+    and then atomically replaces index.json. Readers of the old version are
+    not disturbed, and a crash never leaves a half-written store behind.
+    """
+    FORMAT = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.people = []
+        self.next_label = 0
+        self.matrix = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self.load()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, "index.json")
+
+    def _matrix_path(self, version):
+        return os.path.join(self.path, f"encodings-{version:06d}.npy")
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return self
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("format") != self.FORMAT:
+                logging.info(f"Ignoring embedding store {self.path}: format {index.get('format')}")
+                return self
+            matrix_path = os.path.join(self.path, index["encodings"])
+            rows = sum(person["count"] for person in index["people"])
+            matrix = np.load(matrix_path, mmap_mode="r") if rows else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        except Exception as e:
+            logging.error(f"Failed to load embedding store {self.path}: {e}")
+            return self
+        self.version = index["version"]
+        self.people = index["people"]
+        for position, person in enumerate(self.people):
+            person.setdefault("label", position)
+        self.next_label = index.get("next_label", len(self.people))
+        self.matrix = matrix
+        return self
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def find(self, key):
+        for person in self.people:
+            if person["key"] == key:
+                return person
+        return None
+
+    def encodings(self, key):
+        """Read-only view of one person's rows"""
+        person = self.find(key)
+        if person is None:
+            return None
+        return self.matrix[person["offset"]:person["offset"] + person["count"]]
+
+    def labels(self):
+        """Label of every row, plus {label: info}"""
+        counts = [person["count"] for person in self.people]
+        labels = np.repeat(np.array([person["label"] for person in self.people], dtype=np.int64), counts)
+        return labels, {person["label"]: person["info"] for person in self.people}
+
+    def update(self, changes=(), removed=(), first_label=0):
+        """Write a new version with `changes` applied and `removed` keys dropped.
+
+        Each change is (key, info, sample names, encodings, files), where
+        files maps image file names to [mtime_ns, size]. New people get
+        labels from `first_label` up at the lowest.
+        """
+        with _write_lock:
+            # Another thread may have written since this store was loaded
+            self.load()
+            self.next_label = max(self.next_label, first_label)
+            changes = {key: (info, list(names), np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM), files)
+                       for key, info, names, encodings, files in changes}
+            removed = set(removed)
+
+            blocks, people, offset = [], [], 0
+            kept_labels = {}
+            for person in self.people:
+                key = person["key"]
+                if key in changes:
+                    kept_labels[key] = person["label"]
+                if key in removed or key in changes:
+                    continue
+                blocks.append(self.matrix[person["offset"]:person["offset"] + person["count"]])
+                people.append(dict(person, offset=offset))
+                offset += person["count"]
+            for key, (info, names, encodings, files) in changes.items():
+                if not len(encodings):
+                    continue
+                if key not in kept_labels:
+                    kept_labels[key] = self.next_label
+                    self.next_label += 1
+                blocks.append(encodings)
+                people.append({"key": key, "label": kept_labels[key], "info": info, "offset": offset,
+                               "count": len(encodings), "samples": names, "files": files or {},
+                               "updated": time.time()})
+                offset += len(encodings)
+            self._write(people, blocks)
+        return self
+
+    def _write(self, people, blocks):
+        os.makedirs(self.path, exist_ok=True)
+        version = self.version + 1
+        matrix_path = self._matrix_path(version)
+        matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.float32,
+                                           shape=(sum(len(block) for block in blocks), EMBEDDING_DIM))
+        offset = 0
+        for block in blocks:
+            matrix[offset:offset + len(block)] = block
+            offset += len(block)
+        matrix.flush()
+        del matrix
+
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": self.FORMAT, "version": version, "dim": EMBEDDING_DIM, "next_label": self.next_label,
+                       "encodings": os.path.basename(matrix_path), "people": people}, f)
+        os.replace(tmp_path, self.index_path)
+
+        old_version = self.version
+        self.matrix = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self.version = 0
+        self.load()
+        self._remove_old_versions(old_version)
+        logging.info(f"Embedding store version {version}: {len(people)} people, {offset} samples")
+
+    def _remove_old_versions(self, up_to):
+        for name in os.listdir(self.path):
+            if not (name.startswith("encodings-") and name.endswith(".npy")):
+                continue
+            try:
+                if int(name[len("encodings-"):-len(".npy")]) <= up_to:
+                    os.remove(os.path.join(self.path, name))
+            except (ValueError, OSError):
+                # Still mapped by a reader on Windows; removed by a later write
+                continue
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from face_encoder import encode_face_chips
+
+
+class EncodingBatcher:
+    """Encodes and classifies face chips from many frames in shared batches.
+
+    Recognition threads submit() the chips of one frame and wait on the
+    returned future. A background thread gathers the chips of all waiting
+    frames until `max_batch` faces, `max_requests` frames or `max_delay`
+    seconds since the oldest one, runs the encoder network and `classify`
+    once over the whole batch, and hands each frame back its own slice of
+    (identities, confident).
+    """
+
+    def __init__(self, classify, max_batch=64, max_delay=0.01, max_requests=None):
+        self.classify = classify
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_requests = max_requests
+        self.pending = []
+        self.pending_faces = 0
+        self.condition = threading.Condition()
+        self.is_running = False
+        self.thread = None
+        self.batches = 0
+        self.faces = 0
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name="encoding-batcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+        with self.condition:
+            pending, self.pending, self.pending_faces = self.pending, [], 0
+        for _, future, _ in pending:
+            future.set_exception(RuntimeError("Encoding batcher stopped"))
+
+    def submit(self, chips):
+        """Queue the chips of one frame; the future resolves to (identities, confident)"""
+        future = Future()
+        if not chips:
+            future.set_result(([], []))
+            return future
+        with self.condition:
+            if not self.is_running:
+                future.set_exception(RuntimeError("Encoding batcher is not running"))
+                return future
+            self.pending.append((chips, future, time.monotonic()))
+            self.pending_faces += len(chips)
+            self.condition.notify_all()
+        return future
+
+    def _ready(self):
+        if not self.pending:
+            return False
+        if self.pending_faces >= self.max_batch:
+            return True
+        if self.max_requests and len(self.pending) >= self.max_requests:
+            return True
+        return time.monotonic() - self.pending[0][2] >= self.max_delay
+
+    def _take_batch(self):
+        batch, faces = [], 0
+        while self.pending and (not batch or faces + len(self.pending[0][0]) <= self.max_batch):
+            request = self.pending.pop(0)
+            batch.append(request)
+            faces += len(request[0])
+        self.pending_faces -= faces
+        return batch
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.is_running and not self._ready():
+                    timeout = None
+                    if self.pending:
+                        timeout = max(0.0, self.max_delay - (time.monotonic() - self.pending[0][2]))
+                    self.condition.wait(timeout)
+                if not self.is_running:
+                    return
+                batch = self._take_batch()
+            self._process(batch)
+
+    def _process(self, batch):
+        chips = [chip for request_chips, _, _ in batch for chip in request_chips]
+        try:
+            identities, confident = self.classify(encode_face_chips(chips))
+        except Exception as e:
+            logging.error(f"Error encoding a batch of {len(chips)} faces: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.faces += len(chips)
+
+        start = 0
+        for request_chips, future, _ in batch:
+            end = start + len(request_chips)
+            future.set_result((identities[start:end], confident[start:end]))
+            start = end
@@ -0,0 +1,99 @@
+import hashlib
+import logging
+import os
+import pickle
+
+
+class EncodingCache:
+    """On-disk store of face encodings keyed by image path, mtime and content hash."""
+    VERSION = 1
+
+    def __init__(self, path, variant="hog"):
+        self.path = path
+        self.variant = variant
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    @staticmethod
+    def _key(img_path):
+        return os.path.normcase(os.path.abspath(img_path))
+
+    @staticmethod
+    def file_digest(img_path):
+        digest = hashlib.sha1()
+        with open(img_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") == self.VERSION and data.get("variant") == self.variant:
+                self.entries = data.get("entries", {})
+            else:
+                logging.info(f"Ignoring encoding cache {self.path}: version {data.get('version')}, "
+                             f"variant {data.get('variant')}")
+        except Exception as e:
+            logging.error(f"Failed to load encoding cache {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": self.VERSION, "variant": self.variant, "entries": self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def get(self, img_path):
+        """Return (hit, encoding); encoding is None for cached images without a face."""
+        key = self._key(img_path)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        stat = os.stat(img_path)
+        if entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            # Touched files are only re-encoded if their content really changed
+            if entry["sha1"] != self.file_digest(img_path):
+                self.misses += 1
+                return False, None
+            entry["mtime"] = stat.st_mtime_ns
+            entry["size"] = stat.st_size
+            self.dirty = True
+
+        self.hits += 1
+        return True, entry["encoding"]
+
+    def put(self, img_path, encoding):
+        stat = os.stat(img_path)
+        self.entries[self._key(img_path)] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha1": self.file_digest(img_path),
+            "encoding": encoding,
+        }
+        self.dirty = True
+
+    def prune(self, img_paths):
+        """Drop entries for images that are no longer part of the dataset."""
+        keep = {self._key(p) for p in img_paths}
+        stale = [key for key in self.entries if key not in keep]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self.dirty = True
+            logging.info(f"Removed {len(stale)} stale entries from encoding cache")
+        return len(stale)
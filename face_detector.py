@@ -0,0 +1,89 @@
+import logging
+import cv2
+import face_recognition
+from face_tracker import box_iou
+from config import DETECTOR_BACKEND, HAAR_CASCADE_PATH
+
+DETECTOR_BACKENDS = ("hog", "haar", "cascade")
+
+
+class HogDetector:
+    """dlib HOG detector: the most accurate, and the slowest"""
+    backend = "hog"
+
+    def detect(self, rgb_image):
+        return face_recognition.face_locations(rgb_image, model="hog")
+
+
+class HaarDetector:
+    """OpenCV Haar cascade using the bundled frontal face model; fast and multithreaded"""
+    backend = "haar"
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, scale_factor=1.1, min_neighbors=5, min_size=(20, 20)):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise ImportError("This OpenCV build has no Haar cascade support (moved to contrib in OpenCV 5)")
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        if self.classifier.empty():
+            raise FileNotFoundError(f"Could not load Haar cascade {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb_image):
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        faces = self.classifier.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=self.min_size
+        )
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
+
+
+class CascadeDetector:
+    """Haar proposes face regions and HOG confirms them, running only inside each region.
+
+    Costs little more than Haar on empty frames and rejects most of its false
+    positives, at the price of missing faces Haar does not propose.
+    """
+    backend = "cascade"
+
+    def __init__(self, haar=None, hog=None, margin=0.3, overlap=0.5):
+        self.haar = haar or HaarDetector(min_neighbors=3)
+        self.hog = hog or HogDetector()
+        self.margin = margin
+        self.overlap = overlap
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        confirmed = []
+        for top, right, bottom, left in self.haar.detect(rgb_image):
+            pad_y = int((bottom - top) * self.margin)
+            pad_x = int((right - left) * self.margin)
+            roi_top, roi_left = max(0, top - pad_y), max(0, left - pad_x)
+            roi_bottom, roi_right = min(height, bottom + pad_y), min(width, right + pad_x)
+            roi = rgb_image[roi_top:roi_bottom, roi_left:roi_right]
+            for face_top, face_right, face_bottom, face_left in self.hog.detect(roi):
+                box = (face_top + roi_top, face_right + roi_left, face_bottom + roi_top, face_left + roi_left)
+                # Overlapping proposals can confirm the same face twice
+                if all(box_iou(box, other) < self.overlap for other in confirmed):
+                    confirmed.append(box)
+        return confirmed
+
+
+def create_detector(backend=DETECTOR_BACKEND):
+    if backend == "hog":
+        return HogDetector()
+    if backend == "haar":
+        return HaarDetector()
+    if backend == "cascade":
+        return CascadeDetector()
+    raise ValueError(f"Unknown detector backend {backend!r}, expected one of {DETECTOR_BACKENDS}")
+
+
+_detectors = {}
+
+
+def get_detector(backend=DETECTOR_BACKEND):
+    """Detector shared within this process, e.g. by the recognition worker processes"""
+    if backend not in _detectors:
+        _detectors[backend] = create_detector(backend)
+        logging.info(f"Face detector backend: {backend}")
+    return _detectors[backend]
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import dlib
+import numpy as np
+import face_recognition
+from config import ENCODING_CHIP_PADDING
+
+# dlib's face recognition network only accepts aligned chips of this size
+CHIP_SIZE = 150
+
+
+def known_face_location(img_path, img):
+    """Face box of a dataset image: its location sidecar, else the whole crop"""
+    sidecar_path = f"{img_path}.json"
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path) as f:
+            top, right, bottom, left = json.load(f)["location"]
+        return int(top), int(right), int(bottom), int(left)
+    height, width = img.shape[:2]
+    return 0, width, height, 0
+
+
+def face_landmarks_5(rgb_image, face_locations):
+    """5-point landmarks of every face: two corners per eye, then the base of the nose"""
+    shapes = dlib.full_object_detections()
+    for top, right, bottom, left in face_locations:
+        shapes.append(face_recognition.api.pose_predictor_5_point(rgb_image, dlib.rectangle(left, top, right, bottom)))
+    return shapes
+
+
+def extract_face_chips(rgb_image, face_locations, padding=ENCODING_CHIP_PADDING, landmarks=None):
+    """Cut every face out of the image as an aligned CHIP_SIZE x CHIP_SIZE chip"""
+    if not face_locations:
+        return []
+    if landmarks is None:
+        landmarks = face_landmarks_5(rgb_image, face_locations)
+    return list(dlib.get_face_chips(rgb_image, landmarks, size=CHIP_SIZE, padding=padding))
+
+
+def encode_face_chips(chips):
+    """Run the encoder network once over a batch of aligned chips"""
+    if not chips:
+        return []
+    return [np.array(descriptor) for descriptor in face_recognition.api.face_encoder.compute_face_descriptor(chips)]
+
+
+def encode_faces(rgb_image, face_locations, padding=ENCODING_CHIP_PADDING):
+    """Encode faces from aligned, fixed-size chips in one batched network call.
+
+    Gives the same embeddings as face_recognition.face_encodings (5-point
+    landmarks, dlib's default padding), but every face is cut out and
+    normalised once and the network runs on the whole batch, so the cost
+    per face no longer depends on the frame resolution.
+    """
+    return encode_face_chips(extract_face_chips(rgb_image, face_locations, padding))
+
+
+def encode_image_file(img_path, known_crop=False):
+    """Return the face encoding of an image file, or None if no face is found.
+
+    With known_crop the image is trusted to be a face crop saved by the
+    capture flow, so HOG detection is skipped and the crop geometry goes
+    straight to the landmark predictor and encoder.
+    """
+    img = face_recognition.load_image_file(img_path)
+    if known_crop:
+        location = known_face_location(img_path, img)
+        face_encodings = encode_faces(img, [location])
+    else:
+        face_encodings = face_recognition.face_encodings(img, model="hog")
+    return face_encodings[0] if face_encodings else None
+
+
+def encode_image_chunk(img_paths, known_crop=False):
+    """Worker entry point: encode a chunk of images, failures map to None"""
+    results = []
+    for img_path in img_paths:
+        try:
+            results.append((img_path, encode_image_file(img_path, known_crop)))
+        except Exception as e:
+            logging.error(f"Error encoding {img_path}: {e}")
+            results.append((img_path, None))
+    return results
+
+
+def resolve_workers(workers):
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+
+def encode_images(img_paths, workers=1, chunk_size=16, progress_callback=None, known_crop=False):
+    """Encode images serially or over a process pool, yielding (path, encoding).
+
+    progress_callback(done, total) is called from the calling thread after
+    every image (serial) or every finished chunk (process pool).
+    """
+    img_paths = list(img_paths)
+    total = len(img_paths)
+    workers = resolve_workers(workers)
+
+    if workers <= 1 or total <= chunk_size:
+        for done, img_path in enumerate(img_paths, start=1):
+            yield encode_image_chunk([img_path], known_crop)[0]
+            if progress_callback:
+                progress_callback(done, total)
+        return
+
+    chunks = [img_paths[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        futures = [executor.submit(encode_image_chunk, chunk, known_crop) for chunk in chunks]
+        for future in as_completed(futures):
+            results = future.result()
+            done += len(results)
+            yield from results
+            if progress_callback:
+                progress_callback(done, total)
@@ -0,0 +1,134 @@
+import logging
+import pickle
+import numpy as np
+
+
+class BruteForceIndex:
+    """Exact nearest-neighbour search over every enrolled encoding."""
+    backend = "brute"
+
+    def __init__(self):
+        self.encodings = np.empty((0, 128), dtype=np.float32)
+        self.labels = np.empty((0,), dtype=np.int64)
+        self._sq_norms = np.empty((0,), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def build(self, encodings, labels):
+        self.encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self._sq_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        return self
+
+    def search(self, queries):
+        """Return (labels, distances) of the nearest sample for every query row."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        if len(queries) == 0 or len(self.labels) == 0:
+            return np.full(len(queries), -1, dtype=np.int64), np.full(len(queries), np.inf, dtype=np.float32)
+
+        distances = _squared_distances(queries, self.encodings, self._sq_norms)
+        nearest = np.argmin(distances, axis=1)
+        best = distances[np.arange(len(queries)), nearest]
+        return self.labels[nearest], np.sqrt(np.maximum(best, 0.0))
+
+
+class PartitionedIndex(BruteForceIndex):
+    """Inverted-file index: k-means partitions, only the closest ones are scanned."""
+    backend = "partitioned"
+
+    def __init__(self, n_partitions=None, n_probe=4, iterations=10, seed=42):
+        super().__init__()
+        self.n_partitions = n_partitions
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = np.empty((0, 128), dtype=np.float32)
+        self.partitions = []
+
+    def build(self, encodings, labels):
+        super().build(encodings, labels)
+        n_samples = len(self.labels)
+        if n_samples == 0:
+            self.centroids = np.empty((0, 128), dtype=np.float32)
+            self.partitions = []
+            return self
+
+        n_partitions = self.n_partitions or int(np.sqrt(n_samples))
+        n_partitions = max(1, min(n_partitions, n_samples))
+        rng = np.random.default_rng(self.seed)
+        centroids = self.encodings[rng.choice(n_samples, n_partitions, replace=False)].copy()
+
+        assignment = np.zeros(n_samples, dtype=np.int64)
+        for _ in range(self.iterations):
+            centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+            assignment = np.argmin(_squared_distances(self.encodings, centroids, centroid_norms), axis=1)
+            for k in range(n_partitions):
+                members = self.encodings[assignment == k]
+                if len(members):
+                    centroids[k] = members.mean(axis=0)
+
+        self.centroids = centroids
+        self.partitions = [np.flatnonzero(assignment == k) for k in range(n_partitions)]
+        logging.info(f"Built partitioned face index: {n_samples} samples in {n_partitions} partitions")
+        return self
+
+    def search(self, queries):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        if len(queries) == 0 or len(self.labels) == 0:
+            return super().search(queries)
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        centroid_distances = _squared_distances(queries, self.centroids, centroid_norms)
+        probes = np.argsort(centroid_distances, axis=1)[:, :n_probe]
+
+        labels = np.empty(len(queries), dtype=np.int64)
+        distances = np.empty(len(queries), dtype=np.float32)
+        for i, query_probes in enumerate(probes):
+            candidates = np.concatenate([self.partitions[k] for k in query_probes])
+            candidate_distances = _squared_distances(
+                queries[i:i + 1], self.encodings[candidates], self._sq_norms[candidates]
+            )[0]
+            nearest = np.argmin(candidate_distances)
+            labels[i] = self.labels[candidates[nearest]]
+            distances[i] = np.sqrt(max(candidate_distances[nearest], 0.0))
+        return labels, distances
+
+
+INDEX_BACKENDS = {
+    BruteForceIndex.backend: BruteForceIndex,
+    PartitionedIndex.backend: PartitionedIndex,
+}
+
+
+def _squared_distances(queries, samples, sample_sq_norms):
+    query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+    return query_sq_norms[:, None] + sample_sq_norms[None, :] - 2.0 * queries @ samples.T
+
+
+def create_index(backend="auto", n_samples=0, partition_threshold=2000, **kwargs):
+    """Create an empty index; 'auto' picks brute force for small galleries."""
+    if backend == "auto":
+        backend = PartitionedIndex.backend if n_samples >= partition_threshold else BruteForceIndex.backend
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown face index backend: {backend}")
+    return INDEX_BACKENDS[backend](**kwargs)
+
+
+def build_index(encodings, labels, backend="auto", partition_threshold=2000):
+    index = create_index(backend, n_samples=len(labels), partition_threshold=partition_threshold)
+    return index.build(encodings, labels)
+
+
+def save_index(index, path):
+    with open(path, "wb") as f:
+        pickle.dump(index, f)
+
+
+def load_index(path):
+    with open(path, "rb") as f:
+        index = pickle.load(f)
+    if not isinstance(index, BruteForceIndex):
+        raise TypeError(f"{path} does not contain a face index")
+    return index
@@ -1,27 +1,46 @@
-import os
-import pickle
 import queue
 import cv2
-import joblib
+import numpy as np
 from tkinter import messagebox
 import customtkinter as ctk
 from PIL import Image, ImageTk
 import threading
 from datetime import datetime, timedelta
 import time
-import face_recognition
 import logging
 from database import SeanceDB, AttendanceDB, StudentDB, TeacherDB
-from config import Theme
+from attendance_writer import AttendanceWriter
+from roster_cache import RosterCache
+from recognition_pipeline import RecognitionPipeline, load_recognition_model
+from recognition_workers import RecognitionWorkerPool
+from face_encoder import resolve_workers
+from frame_ring import FrameRing
+from frame_source import open_frame_source
+from config import Theme, CAMERA_SOURCE, RECOGNITION_PROCESSES
+from config import ATTENDANCE_FLUSH_INTERVAL, ATTENDANCE_FLUSH_SIZE
 
 logging.basicConfig(filename='face_recognition.log', level=logging.DEBUG,
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
 class CameraWindow:
-    def __init__(self, parent, model, reverse_label_map):
+    def __init__(self, parent, model, reverse_label_map, face_index=None):
         self.parent = parent
         self.model = model
         self.reverse_label_map = reverse_label_map
+        self.face_index = face_index
+        self.pipeline = RecognitionPipeline(model, reverse_label_map, face_index)
+        self.worker_pool = None
+        if resolve_workers(RECOGNITION_PROCESSES) > 1:
+            # Workers only detect; the tracker decides which faces are encoded
+            self.worker_pool = RecognitionWorkerPool(RECOGNITION_PROCESSES, encode=False,
+                                                     controller=self.pipeline.controller)
+            self.pipeline.worker_pool = self.worker_pool
+        # Capture, processing (or every frame in flight in the pool) and display each hold a slot
+        in_flight = self.worker_pool.max_in_flight if self.worker_pool else 1
+        self.ring = FrameRing(in_flight + 4, (480, 640, 3), shared=self.worker_pool is not None)
+        if self.worker_pool:
+            self.worker_pool.ring = self.ring
+        self.display_rgb = np.empty((480, 640, 3), dtype=np.uint8)
         self.window = ctk.CTkToplevel(parent)
         self.window.title("Camera Feed")
         self.window.geometry("640x480")
@@ -39,7 +58,6 @@ class CameraWindow:
 
         self.camera = None
         self.is_running = False
-        self.frame_queue = queue.Queue(maxsize=1)
         self.detection_results = queue.Queue(maxsize=1)
         self.process_thread = None
         self.capture_thread = None
@@ -57,25 +75,28 @@ class CameraWindow:
 
         self.camera_label.configure(fg_color=get_color(self.theme["background"]))
 
-    def start_camera(self):
-        self.camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        if not self.camera.isOpened():
-            for alt_index in range(1, 3):
-                self.camera.release()
-                self.camera = cv2.VideoCapture(alt_index, cv2.CAP_DSHOW)
-                if self.camera.isOpened():
-                    break
-            if not self.camera.isOpened():
-                logging.error("Failed to open camera")
-                return False
+    def start_camera(self, source=None):
+        self.camera = open_frame_source(
+            CAMERA_SOURCE if source is None else source,
+            resolution=(640, 480),
+            fps=30,
+            fallback_indices=(1, 2)
+        )
+        if not self.camera.open():
+            logging.error(f"Failed to open frame source {self.camera}")
+            self.ring.close()
+            return False
 
-        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        self.camera.set(cv2.CAP_PROP_FPS, 30)
         self.is_running = True
 
+        process_target = self._process_frames
+        if self.worker_pool:
+            self.worker_pool.start()
+            process_target = self._process_frames_pooled
+            logging.info(f"Recognition running on {self.worker_pool.workers} worker processes")
+
         self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
-        self.process_thread = threading.Thread(target=self._process_frames, daemon=True)
+        self.process_thread = threading.Thread(target=process_target, daemon=True)
         self.display_thread = threading.Thread(target=self._update_display, daemon=True)
         self.capture_thread.start()
         self.process_thread.start()
@@ -85,77 +106,85 @@ class CameraWindow:
 
     def _capture_frames(self):
         while self.is_running:
-            ret, frame = self.camera.read()
-            if ret:
-                try:
-                    if not self.frame_queue.full():
-                        self.frame_queue.put_nowait(frame.copy())
-                    else:
-                        with self.frame_queue.mutex:
-                            self.frame_queue.queue.clear()
-                        self.frame_queue.put_nowait(frame.copy())
-                except queue.Full:
-                    pass
-            else:
-                logging.warning("Failed to capture frame")
-                time.sleep(0.01)
+            index, buffer = self.ring.acquire()
+            if index is None:
+                time.sleep(0.005)
+                continue
+            if self.camera.read_into(buffer):
+                self.ring.commit(index)
+                continue
+            self.ring.cancel(index)
+            if self.camera.finished:
+                logging.info(f"Frame source {self.camera} exhausted")
+                break
+            logging.warning("Failed to capture frame")
+            time.sleep(0.01)
+
+    def _publish(self, index, face_locations, face_names):
+        """Hand a processed slot to the display, or give it back if the display is busy"""
+        try:
+            self.detection_results.put_nowait((index, face_locations, face_names))
+        except queue.Full:
+            self.ring.release(index)
 
     def _process_frames(self):
         while self.is_running:
+            index = self.ring.take(timeout=0.5)
+            if index is None:
+                continue
             try:
-                frame = self.frame_queue.get(timeout=0.5)
-                if frame is None:
-                    continue
-
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                small_frame = cv2.resize(rgb_frame, (0, 0), fx=0.25, fy=0.25)
-
-                face_locations = face_recognition.face_locations(small_frame, model="hog")
-                face_locations = [
-                    (int(top / 0.25), int(right / 0.25), int(bottom / 0.25), int(left / 0.25))
-                    for top, right, bottom, left in face_locations
-                ]
-
-                face_names = []
-                if face_locations and self.model and self.reverse_label_map:
-                    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-                    for encoding in face_encodings:
-                        try:
-                            label_id = self.model.predict([encoding])[0]
-                            prob = max(self.model.predict_proba([encoding])[0])
-                            if prob < 0.6:
-                                face_names.append(("Unknown", None, None))
-                            else:
-                                person_info = self.reverse_label_map.get(label_id, {})
-                                name = person_info.get('name', 'Unknown')
-                                person_id = person_info.get('student_id', person_info.get('user_id', None))
-                                person_type = person_info.get('type', None)
-                                face_names.append((name, person_id, person_type))
-                        except Exception as e:
-                            logging.error(f"Error predicting face: {e}")
-                            face_names.append(("Unknown", None, None))
-                else:
-                    face_names = [("Unknown", None, None)] * len(face_locations)
+                face_locations, face_names = self.pipeline.process(self.ring.frame(index))
+                self._publish(index, face_locations, face_names)
+            except Exception as e:
+                logging.error(f"Error processing frame: {e}")
+                self.ring.release(index)
 
-                if not self.detection_results.full():
-                    self.detection_results.put_nowait((frame, face_locations, face_names))
+    def _skip_pooled(self, index):
+        """Frames strided over or unchanged are not sent to the pool and reuse the previous result"""
+        controller, gate = self.pipeline.controller, self.pipeline.motion_gate
+        if self.pipeline.last_result is None:
+            return False
+        if controller and controller.should_skip():
+            return True
+        return gate is not None and not gate.should_process(self.ring.frame(index))
 
-            except queue.Empty:
-                continue
+    def _process_frames_pooled(self):
+        while self.is_running:
+            try:
+                if self.worker_pool.has_capacity:
+                    index = self.ring.take(timeout=0.01 if self.worker_pool.in_flight else 0.5)
+                    if index is not None and self._skip_pooled(index):
+                        # Queued in order so the preview keeps moving with the last result
+                        self.worker_pool.skip(index)
+                    elif index is not None:
+                        self.worker_pool.submit_slot(index)
+
+                for _, index, face_locations, _ in self.worker_pool.collect(timeout=0.01):
+                    if face_locations is None:
+                        face_locations, face_names = self.pipeline.last_result or ([], [])
+                    else:
+                        face_names = self.pipeline.identify_faces(self.ring.frame(index), face_locations)
+                        self.pipeline.last_result = face_locations, face_names
+                    self._publish(index, face_locations, face_names)
             except Exception as e:
                 logging.error(f"Error processing frame: {e}")
 
     def _update_display(self):
         while self.is_running:
             try:
-                frame, face_locations, face_names = self.detection_results.get(timeout=0.5)
-
+                index, face_locations, face_names = self.detection_results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                frame = self.ring.frame(index)
                 for (top, right, bottom, left), (name, _, _) in zip(face_locations, face_names):
                     cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
                     cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
 
-                img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(img)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.display_rgb)
+                img = Image.fromarray(self.display_rgb)
+                self.ring.release(index)
+                index = None
                 img_tk = ctk.CTkImage(light_image=img, size=(640, 480))
 
                 self.camera_label.configure(image=img_tk)
@@ -163,15 +192,30 @@ class CameraWindow:
 
                 self.parent.update_recognized_persons(face_names, face_locations)
 
-            except queue.Empty:
-                continue
             except Exception as e:
                 logging.error(f"Error updating display: {e}")
+            finally:
+                if index is not None:
+                    self.ring.release(index)
 
     def on_close(self):
         self.is_running = False
-        if self.camera and self.camera.isOpened():
+        # The display thread updates Tk widgets and cannot be joined from the Tk thread;
+        # it stops on its own once the ring hands out no more slots
+        for thread in (self.capture_thread, self.process_thread):
+            if thread:
+                thread.join(timeout=1.0)
+        if self.camera:
             self.camera.release()
+        if self.worker_pool:
+            self.worker_pool.stop()
+        # Slots waiting for the display are never shown now
+        while True:
+            try:
+                self.ring.release(self.detection_results.get_nowait()[0])
+            except queue.Empty:
+                break
+        self.ring.close()
         self.window.destroy()
 
 class FaceRecognition(ctk.CTkFrame):
@@ -182,14 +226,21 @@ class FaceRecognition(ctk.CTkFrame):
         self.camera_window = None
         self.model = None
         self.reverse_label_map = None
+        self.face_index = None
         self.is_running = False
         self.recognition_start_time = None
         self.last_recognitions = {}
         self.recognition_durations = {}
         self.attendance_db = AttendanceDB(self.db_connection)
+        self.attendance_writer = AttendanceWriter(
+            self.attendance_db,
+            flush_interval=ATTENDANCE_FLUSH_INTERVAL,
+            flush_size=ATTENDANCE_FLUSH_SIZE
+        )
         self.seance_db = SeanceDB(self.db_connection)
         self.student_db = StudentDB(self.db_connection)
         self.teacher_db = TeacherDB(self.db_connection)
+        self.roster = RosterCache(self.student_db, self.teacher_db)
         self.current_seance = None
         self.seance_end_time = None
         self.after_id = None
@@ -204,27 +255,17 @@ class FaceRecognition(ctk.CTkFrame):
         self.setup_ui()
         self.check_seance_and_start()
 
+    @property
+    def model_loaded(self):
+        # The face index alone recognises people enrolled since the last training
+        return self.model is not None or self.face_index is not None
+
     def load_model(self):
         try:
-            model_path = os.path.join("models", "face_recognition_svm.pkl")
-            label_map_path = os.path.join("models", "label_map.pickle")
-
-            if not os.path.exists(model_path) or not os.path.exists(label_map_path):
-                raise FileNotFoundError("Model or label map files not found")
-
-            self.model = joblib.load(model_path)
-            with open(label_map_path, 'rb') as f:
-                self.reverse_label_map = pickle.load(f)
-
-            valid_label_map = {}
-            for label_id, info in self.reverse_label_map.items():
-                person_id = info.get('student_id', info.get('user_id', None))
-                person_type = info.get('type', None)
-                if person_id and person_type and self.validate_person_id(person_id, person_type):
-                    valid_label_map[label_id] = info
-                else:
-                    logging.warning(f"Removing invalid entry from label map: {info}")
-            self.reverse_label_map = valid_label_map
+            self.model, self.reverse_label_map, self.face_index = load_recognition_model()
+
+            self.roster.load()
+            self.reverse_label_map = self.roster.filter_label_map(self.reverse_label_map)
 
             logging.info("Model and validated label map loaded successfully")
         except Exception as e:
@@ -232,6 +273,7 @@ class FaceRecognition(ctk.CTkFrame):
             messagebox.showerror("Loading Error", f"Failed to load model: {str(e)}")
             self.model = None
             self.reverse_label_map = None
+            self.face_index = None
 
     def setup_ui(self):
 
@@ -277,7 +319,7 @@ class FaceRecognition(ctk.CTkFrame):
 
         self.status_label = ctk.CTkLabel(
             info_frame,
-            text="Status: Ready" if self.model else "Status: Model not loaded",
+            text="Status: Ready" if self.model_loaded else "Status: Model not loaded",
             font=self.theme["font_normal"],
             text_color=self.theme["secondary"],
             anchor="w"
@@ -341,7 +383,7 @@ class FaceRecognition(ctk.CTkFrame):
             hover_color=self.theme["button_hover"],
             text_color=self.theme["secondary"],
             font=self.theme["font_normal"],
-            state="normal" if self.model else "disabled",
+            state="normal" if self.model_loaded else "disabled",
             corner_radius=6
         )
         self.start_btn.pack(fill="x", pady=5)
@@ -545,17 +587,19 @@ class FaceRecognition(ctk.CTkFrame):
                 self.after_id = self.after(30000, self.check_seance_and_start)
 
     def start_recognition(self):
-        if not self.model:
+        if not self.model_loaded:
             messagebox.showerror("Error", "Model not loaded")
             return
 
-        self.camera_window = CameraWindow(self, self.model, self.reverse_label_map)
+        self.camera_window = CameraWindow(self, self.model, self.reverse_label_map, self.face_index)
         if not self.camera_window.start_camera():
             messagebox.showerror("Camera Error", "Could not open camera")
             self.camera_window = None
             return
 
+        self.roster.load()
         self.is_running = True
+        self.attendance_writer.start()
         self.recognition_start_time = time.time()
         self.last_recognitions = {}
         self.recognition_durations = {}
@@ -569,21 +613,9 @@ class FaceRecognition(ctk.CTkFrame):
         self.update_duration()
 
     def validate_person_id(self, person_id, person_type):
-        try:
-            if person_type == "student":
-                student = self.student_db.get_student_by_id(person_id)
-                return student is not None
-            elif person_type == "teacher":
-                cursor = self.db_connection.get_connection().cursor(dictionary=True)
-                query = "SELECT user_id FROM teachers WHERE user_id = %s"
-                cursor.execute(query, (person_id,))
-                teacher = cursor.fetchone()
-                cursor.close()
-                return teacher is not None
-            return False
-        except Exception as e:
-            logging.error(f"Error validating {person_type} ID {person_id}: {e}")
+        if person_type not in ("student", "teacher"):
             return False
+        return self.roster.contains(person_id, person_type)
 
     def update_recognized_persons(self, face_names, face_locations):
         def get_color(color_setting):
@@ -613,13 +645,8 @@ class FaceRecognition(ctk.CTkFrame):
 
             try:
                 status = "present"
-                success = self.attendance_db.record_attendance(
-                    seance_id, person_id, status, person_type
-                )
-                if success:
-                    logging.info(f"Attendance recorded: {person_type} {name} (ID: {person_id}) for seance {seance_id}")
-                else:
-                    logging.warning(f"Failed to record attendance for {person_type} {name} (ID: {person_id})")
+                if self.attendance_writer.record(seance_id, person_id, status, person_type):
+                    logging.info(f"Attendance queued: {person_type} {name} (ID: {person_id}) for seance {seance_id}")
             except Exception as e:
                 logging.error(f"Error recording attendance for {person_type} {name}: {e}")
                 continue
@@ -696,7 +723,8 @@ class FaceRecognition(ctk.CTkFrame):
         if self.camera_window:
             self.camera_window.on_close()
             self.camera_window = None
-        self.start_btn.configure(state="normal" if self.model else "disabled")
+        self.attendance_writer.stop()
+        self.start_btn.configure(state="normal" if self.model_loaded else "disabled")
         self.stop_btn.configure(state="disabled")
         self.status_label.configure(text="Status: Idle", text_color=get_color(self.theme["secondary"]))
         self.progress_bar.set(0)
@@ -0,0 +1,119 @@
+import itertools
+
+UNKNOWN_FACE = ("Unknown", None, None)
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    if intersection == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return intersection / float(area_a + area_b - intersection)
+
+
+def centroid_distance(a, b):
+    """Centroid distance of two boxes relative to the width of the first one"""
+    ay, ax = (a[0] + a[2]) / 2.0, (a[1] + a[3]) / 2.0
+    by, bx = (b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0
+    width = max(1, a[1] - a[3])
+    return ((ay - by) ** 2 + (ax - bx) ** 2) ** 0.5 / width
+
+
+class Track:
+    def __init__(self, track_id, location):
+        self.track_id = track_id
+        self.location = location
+        self.identity = UNKNOWN_FACE
+        self.confident = False
+        self.age = 0
+        self.missed = 0
+        self.last_identified = None
+
+
+class FaceTracker:
+    """Associates detections between frames so known faces are not re-encoded every frame.
+
+    A track is re-identified when it is new, every `reidentify_interval`
+    frames, or every `retry_interval` frames while its last match was weak.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_shift=0.5, reidentify_interval=30,
+                 retry_interval=3, max_missed=5):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_shift = max_centroid_shift
+        self.reidentify_interval = reidentify_interval
+        self.retry_interval = retry_interval
+        self.max_missed = max_missed
+        self.tracks = []
+        self.frame_index = 0
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+        self.frame_index = 0
+
+    def _match(self, face_locations):
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for d, location in enumerate(face_locations):
+                iou = box_iou(track.location, location)
+                if iou >= self.iou_threshold:
+                    pairs.append((1.0 + iou, t, d))
+                else:
+                    shift = centroid_distance(track.location, location)
+                    if shift <= self.max_centroid_shift:
+                        pairs.append((1.0 - shift, t, d))
+
+        matches = {}
+        used_tracks = set()
+        for _, t, d in sorted(pairs, reverse=True):
+            if t in used_tracks or d in matches:
+                continue
+            matches[d] = self.tracks[t]
+            used_tracks.add(t)
+        return matches
+
+    def update(self, face_locations):
+        """Associate this frame's detections with tracks.
+
+        Returns (tracks, pending) where tracks is aligned with face_locations
+        and pending lists the detection indices that need identification.
+        """
+        self.frame_index += 1
+        matches = self._match(face_locations)
+
+        tracks = []
+        pending = []
+        for d, location in enumerate(face_locations):
+            track = matches.get(d)
+            if track is None:
+                track = Track(next(self._ids), location)
+                self.tracks.append(track)
+            track.location = location
+            track.age += 1
+            track.missed = 0
+            tracks.append(track)
+
+            if track.last_identified is None:
+                pending.append(d)
+                continue
+            since = self.frame_index - track.last_identified
+            interval = self.reidentify_interval if track.confident else self.retry_interval
+            if since >= interval:
+                pending.append(d)
+
+        matched = {id(track) for track in tracks}
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return tracks, pending
+
+    def assign(self, track, identity, confident):
+        track.identity = identity
+        track.confident = confident
+        track.last_identified = self.frame_index
@@ -0,0 +1,140 @@
+import logging
+import threading
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+FREE, WRITING, READY, HELD = range(4)
+
+
+class FrameRing:
+    """Preallocated frame slots handed between capture, processing and display.
+
+    The producer fills a slot in place (acquire() then commit()); consumers
+    take() the newest committed slot, may hand its index on to the next stage,
+    and the last stage release()s it. Only indices move between threads, so
+    no frame is copied or allocated on the hot path. A committed frame nobody
+    took yet is recycled by the next commit, which keeps latency at one frame
+    when processing is slower than capture.
+
+    With shared=True the slots live in multiprocessing.shared_memory, and
+    worker processes can attach() to them by name instead of receiving
+    pickled frames. Once closed, acquire() and take() hand out no more
+    slots, so threads still running during shutdown simply stop getting work.
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8, shared=False):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.shm = None
+        if shared and shared_memory is None:
+            logging.warning("multiprocessing.shared_memory unavailable, frame ring kept in process memory")
+            shared = False
+        if shared:
+            size = slots * int(np.prod(self.shape)) * self.dtype.itemsize
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        else:
+            self.frames = np.empty((slots,) + self.shape, dtype=self.dtype)
+        self.states = [FREE] * slots
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    @property
+    def shared(self):
+        return self.shm is not None
+
+    @property
+    def name(self):
+        return self.shm.name if self.shm else None
+
+    def frame(self, index):
+        return self.frames[index]
+
+    def acquire(self):
+        """Reserve a slot for writing; returns (index, frame view) or (None, None) if all slots are busy"""
+        with self.condition:
+            if self.closed:
+                return None, None
+            index = self._find(FREE)
+            if index is None:
+                index = self._find(READY)
+                if index is None:
+                    return None, None
+                self.dropped += 1
+            self.states[index] = WRITING
+            return index, self.frames[index]
+
+    def commit(self, index):
+        """Publish a written slot, recycling any older frame no consumer picked up"""
+        with self.condition:
+            for other, state in enumerate(self.states):
+                if state == READY:
+                    self.states[other] = FREE
+                    self.dropped += 1
+            self.states[index] = READY
+            self.condition.notify_all()
+
+    def cancel(self, index):
+        """Give back a slot acquired for writing without publishing it"""
+        self.release(index)
+
+    def take(self, timeout=None):
+        """Wait for the newest committed slot and hold it; returns its index or None on timeout"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or self._find(READY) is not None, timeout):
+                return None
+            if self.closed:
+                return None
+            index = self._find(READY)
+            self.states[index] = HELD
+            return index
+
+    def release(self, index):
+        with self.condition:
+            self.states[index] = FREE
+            self.condition.notify_all()
+
+    def close(self, timeout=1.0):
+        """Stop handing out slots and free the shared memory once no slot is being written or read"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            idle = self.condition.wait_for(lambda: all(state in (FREE, READY) for state in self.states), timeout)
+        if self.shm is not None:
+            if idle:
+                self.frames = None
+                try:
+                    self.shm.close()
+                except BufferError:
+                    logging.warning("Frame ring closed while frame views are still in use")
+            else:
+                # Unmapping under a thread still using a slot would crash it; the mapping goes with the process
+                logging.warning("Frame ring closed while slots are still in use")
+            self.shm.unlink()
+            self.shm = None
+
+    def _find(self, state):
+        for index, slot_state in enumerate(self.states):
+            if slot_state == state:
+                return index
+        return None
+
+_attached = {}
+
+
+def attach(name, slots, shape, dtype=np.uint8):
+    """Frame array of a shared FrameRing, for use in worker processes; cached per process"""
+    if name not in _attached:
+        try:
+            # The creating process owns the block: attaching must not unlink it on exit
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, np.ndarray((slots,) + tuple(shape), dtype=dtype, buffer=shm.buf))
+    return _attached[name][1]
@@ -0,0 +1,263 @@
+import logging
+import os
+import platform
+import time
+import cv2
+import numpy as np
+from config import VALID_IMAGE_EXTENSIONS
+
+
+def copy_frame(frame, buffer):
+    """Copy a frame into a preallocated buffer, resizing it if the shapes differ"""
+    if frame.shape == buffer.shape:
+        np.copyto(buffer, frame)
+        return
+    resized = cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer)
+    if resized is not buffer:
+        np.copyto(buffer, resized)
+
+
+class FrameSource:
+    """Common interface of everything recognition and capture can read frames from.
+
+    read() returns (ret, frame) like cv2.VideoCapture; `finished` becomes True
+    once a recorded source is exhausted, so callers can tell end of input
+    from a dropped frame.
+    """
+    is_live = False
+
+    def __init__(self, fps=30, paced=True, loop=False):
+        self.fps = fps
+        self.paced = paced
+        self.loop = loop
+        self.finished = False
+        self._next_frame_time = None
+
+    @property
+    def is_opened(self):
+        raise NotImplementedError
+
+    def open(self):
+        raise NotImplementedError
+
+    def read(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def read_into(self, buffer):
+        """Read the next frame into a preallocated BGR buffer; returns ret"""
+        ret, frame = self.read()
+        if ret:
+            copy_frame(frame, buffer)
+        return ret
+
+    def _pace(self):
+        """Sleep so recorded sources replay at their real frame rate"""
+        if not self.paced or not self.fps:
+            return
+        now = time.perf_counter()
+        if self._next_frame_time is None:
+            self._next_frame_time = now
+        delay = self._next_frame_time - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_frame_time = max(self._next_frame_time, now) + 1.0 / self.fps
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class _CaptureSource(FrameSource):
+    def __init__(self, fps=30, paced=True, loop=False):
+        super().__init__(fps=fps, paced=paced, loop=loop)
+        self.capture = None
+
+    @property
+    def is_opened(self):
+        return self.capture is not None and self.capture.isOpened()
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class CameraSource(_CaptureSource):
+    """Live webcam; DirectShow on Windows, the default OpenCV backend elsewhere"""
+    is_live = True
+
+    def __init__(self, index=0, resolution=(640, 480), fps=30, fallback_indices=()):
+        super().__init__(fps=fps, paced=False)
+        self.index = index
+        self.resolution = resolution
+        self.fallback_indices = tuple(fallback_indices)
+
+    @staticmethod
+    def _backend():
+        return cv2.CAP_DSHOW if platform.system() == "Windows" else cv2.CAP_ANY
+
+    def open(self):
+        for index in (self.index,) + self.fallback_indices:
+            self.capture = cv2.VideoCapture(index, self._backend())
+            if self.capture.isOpened():
+                self.index = index
+                break
+            self.capture.release()
+            self.capture = None
+        else:
+            logging.error(f"Failed to open camera at index {self.index}")
+            return False
+
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        self.capture.set(cv2.CAP_PROP_FPS, self.fps)
+        return True
+
+    def read(self):
+        if not self.is_opened:
+            return False, None
+        return self.capture.read()
+
+    def read_into(self, buffer):
+        if not self.is_opened:
+            return False
+        # OpenCV decodes straight into `buffer` when the camera delivers its shape
+        ret, frame = self.capture.read(buffer)
+        if ret and frame is not buffer:
+            copy_frame(frame, buffer)
+        return ret
+
+    def __repr__(self):
+        return f"CameraSource({self.index})"
+
+
+class StreamSource(_CaptureSource):
+    """Network stream (RTSP/HTTP URL); reconnects when the stream drops"""
+    is_live = True
+
+    def __init__(self, url, reconnect_delay=2.0):
+        super().__init__(paced=False)
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+        if not self.capture.isOpened():
+            logging.error(f"Failed to open stream {self.url}")
+            self.capture = None
+            return False
+        return True
+
+    def read(self):
+        if self.is_opened:
+            ret, frame = self.capture.read()
+            if ret:
+                return ret, frame
+        logging.warning(f"Stream {self.url} dropped, reconnecting")
+        self.release()
+        time.sleep(self.reconnect_delay)
+        self.open()
+        return False, None
+
+    def __repr__(self):
+        return f"StreamSource({self.url!r})"
+
+
+class VideoFileSource(_CaptureSource):
+    """Recorded video replayed in real time (paced) or as fast as possible"""
+
+    def __init__(self, path, paced=True, loop=False):
+        super().__init__(paced=paced, loop=loop)
+        self.path = path
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.path)
+        if not self.capture.isOpened():
+            logging.error(f"Failed to open video file {self.path}")
+            self.capture = None
+            return False
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or self.fps
+        self.finished = False
+        return True
+
+    def read(self):
+        if not self.is_opened:
+            return False, None
+        ret, frame = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        if not ret:
+            self.finished = True
+            return False, None
+        self._pace()
+        return True, frame
+
+    def __repr__(self):
+        return f"VideoFileSource({self.path!r})"
+
+
+class ImageDirectorySource(FrameSource):
+    """Image folder replayed in file name order, paced at `fps` or unpaced"""
+
+    def __init__(self, path, fps=30, paced=False, loop=False):
+        super().__init__(fps=fps, paced=paced, loop=loop)
+        self.path = path
+        self.images = []
+        self.position = 0
+        self._opened = False
+
+    @property
+    def is_opened(self):
+        return self._opened
+
+    def open(self):
+        self.images = []
+        for root, _, files in os.walk(self.path):
+            self.images.extend(os.path.join(root, name) for name in files
+                               if name.lower().endswith(VALID_IMAGE_EXTENSIONS))
+        self.images.sort()
+        self.position = 0
+        self.finished = False
+        self._opened = bool(self.images)
+        if not self._opened:
+            logging.error(f"No images found in {self.path}")
+        return self._opened
+
+    def read(self):
+        while self._opened:
+            if self.position >= len(self.images):
+                if not self.loop:
+                    self.finished = True
+                    return False, None
+                self.position = 0
+            img_path = self.images[self.position]
+            self.position += 1
+            frame = cv2.imread(img_path)
+            if frame is None:
+                logging.warning(f"Skipping unreadable image {img_path}")
+                continue
+            self._pace()
+            return True, frame
+        return False, None
+
+    def release(self):
+        self._opened = False
+
+    def __repr__(self):
+        return f"ImageDirectorySource({self.path!r})"
+
+
+def open_frame_source(spec, resolution=(640, 480), fps=30, paced=True, loop=False, fallback_indices=()):
+    """Build a frame source from a camera index, stream URL, video file or image folder"""
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec), resolution=resolution, fps=fps, fallback_indices=fallback_indices)
+    if "://" in spec:
+        return StreamSource(spec)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=fps, paced=paced, loop=loop)
+    return VideoFileSource(spec, paced=paced, loop=loop)
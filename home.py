@@ -3,7 +3,7 @@ from PIL import Image
 import os
 from tkinter import ttk, messagebox
 from datetime import datetime
-from database import DatabaseConnection, StudentDB, ClassDB, TeacherDB, AttendanceDB, SeanceDB
+from database import DatabaseConnection, StudentDB, ClassDB, TeacherDB, AttendanceDB, SeanceDB, DashboardDB
 from config import Theme
 
 class HomePage(ctk.CTkFrame):
@@ -16,6 +16,9 @@ class HomePage(ctk.CTkFrame):
         self.teacher_db = TeacherDB(db_connection)
         self.attendance_db = AttendanceDB(db_connection)
         self.seance_db = SeanceDB(db_connection)
+        self.dashboard_db = DashboardDB(db_connection)
+        self.dashboard_rows = None
+        self.student_ids = {}
 
         # Load theme
         theme_instance = Theme()
@@ -285,70 +288,24 @@ class HomePage(ctk.CTkFrame):
             messagebox.showerror("Database Error", f"Error fetching classes: {str(e)}")
             return ["All"]
 
-    def get_student_class_and_teacher(self, student_id):
-        """Fetch class and teacher information for a student using ClassDB.get_class_details"""
-        try:
-            classes = self.class_db.get_all_classes()
-            for class_info in classes:
-                class_details = self.class_db.get_class_details(class_info['class_id'])
-                if not class_details or 'students' not in class_details or not class_details['students']:
-                    print(f"No students found for class {class_info['class_name']}")
-                    continue
-                for student in class_details['students']:
-                    if student['student_id'] == student_id:
-                        class_name = class_details['class']['class_name']
-                        # Check teacher field and handle different key names
-                        if class_details.get('teacher'):
-                            teacher_name = class_details['teacher'].get('name', class_details['teacher'].get('teacher_name', 'Unknown Teacher'))
-                        else:
-                            teacher_name = "No Teacher Assigned"
-                        print(f"Student {student_id} found in class {class_name} with teacher {teacher_name}")
-                        return {'class_name': class_name, 'teacher_name': teacher_name}
-            print(f"Student {student_id} not found in any class")
-            return {'class_name': 'No Class', 'teacher_name': 'No Teacher Assigned'}
-        except Exception as e:
-            print(f"Error fetching class/teacher for student {student_id}: {str(e)}")
-            return {'class_name': 'No Class', 'teacher_name': 'No Teacher Assigned'}
+    def load_dashboard_rows(self):
+        """Fetch student, class, teacher and today's status in one pass using DashboardDB"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        self.dashboard_rows = self.dashboard_db.get_student_dashboard(today)
+        self.student_ids = {(row['full_name'], row['email']): row['student_id'] for row in self.dashboard_rows}
+        print(f"Fetched {len(self.dashboard_rows)} students")
 
-    def get_student_attendance_status(self, student_id):
-        """Fetch the latest attendance status for a student using AttendanceDB.get_attendance_by_seance"""
+    def load_student_data(self, filter_teacher=None, filter_class=None, search_query=None, refresh=False):
+        """Load student data with filters, re-querying the database only when refresh is requested"""
         try:
-            seances = self.seance_db.get_all_seances()
-            today = datetime.now().strftime('%Y-%m-%d')
-            today_seance_ids = [s['seance_id'] for s in seances if str(s['date']) == today]
-
-            for seance_id in today_seance_ids:
-                attendance_records = self.attendance_db.get_attendance_by_seance(seance_id)
-                for record in attendance_records:
-                    if record['student_id'] == student_id:
-                        print(f"Attendance status for student {student_id} in seance {seance_id}: {record['status']}")
-                        return record['status'].capitalize()
-            print(f"No attendance record found for student {student_id} today")
-            return "Absent"
-        except Exception as e:
-            print(f"Error fetching attendance status for student {student_id}: {str(e)}")
-            return "Absent"
+            if refresh or self.dashboard_rows is None:
+                self.load_dashboard_rows()
 
-    def load_student_data(self, filter_teacher=None, filter_class=None, search_query=None):
-        """Load student data with filters using methods from database.py"""
-        try:
-            # Fetch all students
-            students = self.student_db.get_all_students()
             student_data = []
-            print(f"Fetched {len(students)} students")
-
-            for student in students:
-                student_id = student['student_id']
-                full_name = student['full_name']
-                email = student['email']
-
-                # Get class and teacher information
-                class_info = self.get_student_class_and_teacher(student_id)
-                class_name = class_info['class_name']
-                teacher_name = class_info['teacher_name']
-
-                # Get attendance status
-                status = self.get_student_attendance_status(student_id)
+            for row in self.dashboard_rows:
+                full_name = row['full_name']
+                class_name = row['class_name']
+                teacher_name = row['teacher_name']
 
                 # Apply filters
                 if filter_teacher and filter_teacher != "All" and teacher_name != filter_teacher:
@@ -358,7 +315,7 @@ class HomePage(ctk.CTkFrame):
                 if search_query and search_query.lower() not in full_name.lower():
                     continue
 
-                student_data.append((full_name, email, class_name, teacher_name, status))
+                student_data.append((full_name, row['email'], class_name, teacher_name, row['status']))
 
             # Clear existing data
             for item in self.student_tree.get_children():
@@ -416,13 +373,8 @@ class HomePage(ctk.CTkFrame):
 
         name, email, class_name, teacher_name, status = student_data
 
-        # Fetch student ID for photo loading
-        students = self.student_db.get_all_students()
-        student_id = None
-        for student in students:
-            if student['full_name'] == name and student['email'] == email:
-                student_id = student['student_id']
-                break
+        # Look up student ID for photo loading
+        student_id = self.student_ids.get((name, email))
 
         self.details_labels['id'].configure(text=str(student_id) if student_id else "N/A")
         self.details_labels['name'].configure(text=name)
@@ -461,14 +413,9 @@ class HomePage(ctk.CTkFrame):
         if not student_data:
             return
 
-        # Fetch student ID based on name and email
+        # Look up student ID based on name and email
         name, email, _, _, _ = student_data
-        students = self.student_db.get_all_students()
-        student_id = None
-        for student in students:
-            if student['full_name'] == name and student['email'] == email:
-                student_id = student['student_id']
-                break
+        student_id = self.student_ids.get((name, email))
 
         if not student_id:
             messagebox.showerror("Error", "Student ID not found")
@@ -501,7 +448,8 @@ class HomePage(ctk.CTkFrame):
                 self.load_student_data(
                     filter_teacher=self.teacher_filter.get(),
                     filter_class=self.class_filter.get(),
-                    search_query=self.search_var.get()
+                    search_query=self.search_var.get(),
+                    refresh=True
                 )
             else:
                 messagebox.showerror("Error", "Failed to record attendance")
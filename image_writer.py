@@ -0,0 +1,73 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+
+class ImageWriter:
+    """Bounded pool of background threads that resize, convert and save images.
+
+    submit() never blocks the caller: it returns False when `max_pending`
+    writes are already queued, and the caller simply tries again with a
+    later frame. Outcomes are collected on a queue and dispatch() runs
+    on_complete(path, error) for each of them on the calling thread, so the
+    Tk loop can drive its progress bar from there. `error` is None on success.
+    """
+
+    def __init__(self, workers=2, max_pending=16, on_complete=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.on_complete = on_complete
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-writer")
+        return self
+
+    def stop(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def submit(self, path, image, size=None, conversion=None):
+        """Queue an image for writing, optionally resized to `size` and converted with cv2 `conversion`"""
+        with self.lock:
+            if self.executor is None or self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+        self.executor.submit(self._write, path, image, size, conversion)
+        return True
+
+    def _write(self, path, image, size, conversion):
+        error = None
+        try:
+            if size is not None:
+                image = cv2.resize(image, size)
+            if conversion is not None:
+                image = cv2.cvtColor(image, conversion)
+            if not cv2.imwrite(path, image):
+                raise IOError(f"Could not write {path}")
+        except Exception as e:
+            logging.error(f"Error saving image {path}: {e}")
+            error = e
+        finally:
+            with self.lock:
+                self.pending -= 1
+        self.results.put((path, error))
+
+    def dispatch(self):
+        """Run the completion callback for every finished write; returns how many finished"""
+        count = 0
+        while True:
+            try:
+                path, error = self.results.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+            if self.on_complete:
+                self.on_complete(path, error)
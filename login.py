@@ -6,7 +6,7 @@ from database import DatabaseConnection, AuthDB
 from config import Theme
 
 class LoginPage(ctk.CTkFrame):
-    def __init__(self, parent, on_login_success, show_sign_up_page):
+    def __init__(self, parent, on_login_success, show_sign_up_page, db_connection=None):
         super().__init__(parent)
         self.on_login_success = on_login_success
         self.show_sign_up_page = show_sign_up_page
@@ -16,8 +16,10 @@ class LoginPage(ctk.CTkFrame):
         self.theme = theme_instance.set_application_theme()
 
         # Setup database
-        self.db_connection = DatabaseConnection()
-        self.db_connection.connect()
+        self.owns_connection = db_connection is None
+        self.db_connection = db_connection or DatabaseConnection()
+        if not self.db_connection.is_connected():
+            self.db_connection.connect()
         self.auth_db = AuthDB(self.db_connection)
 
         # Configure layout
@@ -329,7 +331,10 @@ class LoginPage(ctk.CTkFrame):
         self.after(3000, lambda: self.error_label.configure(text=""))
 
     def destroy(self):
-        """Clean up animation when frame is destroyed"""
+        """Clean up animation and database connection when frame is destroyed"""
         if hasattr(self, 'animation') and self.animation:
             self.after_cancel(self.animation)
+        # Hand a private connection back to the pool
+        if self.owns_connection:
+            self.db_connection.disconnect()
         super().destroy()
\ No newline at end of file
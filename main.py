@@ -49,6 +49,7 @@ class MainApp(ctk.CTk):
             self,
             self.on_login_success,
             self.show_sign_up_page,
+            self.db_connection,
         )
         self.login_page.pack(fill="both", expand=True)
         self.current_frame = self.login_page
@@ -65,6 +66,7 @@ class MainApp(ctk.CTk):
             self,
             self.on_signup_success,
             self.show_login_page,
+            self.db_connection,
         )
         self.sign_up_page.pack(fill="both", expand=True)
         self.current_frame = self.sign_up_page
@@ -218,7 +220,7 @@ class MainApp(ctk.CTk):
 
     def load_setting(self):
         self.clear_content()
-        page = SettingsPage(self.content, self.logged_in_user, self.show_login_out_page)
+        page = SettingsPage(self.content, self.logged_in_user, self.show_login_out_page, self.db_connection)
         page.pack(fill="both", expand=True)
 
     def load_capture(self):
@@ -0,0 +1,153 @@
+import argparse
+import logging
+import os
+import pickle
+import sys
+from embedding_store import EmbeddingStore
+from face_index import build_index, save_index
+from config import EMBEDDING_STORE_PATH, LABEL_MAP_PATH, FACE_INDEX_PATH, INDEX_BACKEND, INDEX_PARTITION_THRESHOLD
+
+
+def _replace_file(path, write):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_label_map():
+    """The {label: info} map of the current model, or {} before the first training"""
+    if not os.path.exists(LABEL_MAP_PATH):
+        return {}
+    with open(LABEL_MAP_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+def store_covers_gallery(store, label_map):
+    """True when every person of the current model is in the store under the same label.
+
+    Models trained before the store existed, or by a training whose store
+    was deleted since, are not covered; rebuilding their gallery from the
+    store would drop everyone it is missing.
+    """
+    _, store_map = store.labels()
+    return all(store_map.get(label) == info for label, info in label_map.items())
+
+
+def rebuild_gallery(store):
+    """Rebuild the face index and label map from the embedding store and save them.
+
+    The face index is the gallery recognition matches against, so this is
+    all an enrolment change needs; no classifier is fitted. The SVM, only
+    used when there is no face index, is refreshed by the next full training
+    and never sees removed people again because their labels leave the map.
+    """
+    labels, reverse_label_map = store.labels()
+    face_index = build_index(store.matrix, labels, backend=INDEX_BACKEND, partition_threshold=INDEX_PARTITION_THRESHOLD)
+
+    def write_label_map(path):
+        with open(path, "wb") as f:
+            pickle.dump(reverse_label_map, f)
+
+    # Index first: a label map naming people missing from the index is harmless, the reverse is not
+    _replace_file(FACE_INDEX_PATH, lambda path: save_index(face_index, path))
+    _replace_file(LABEL_MAP_PATH, write_label_map)
+    logging.info(f"Gallery rebuilt: {len(reverse_label_map)} people, {len(face_index)} samples")
+    return face_index, reverse_label_map
+
+
+def enroll_person(key, info, sample_names, encodings, files=None, store_path=EMBEDDING_STORE_PATH):
+    """Add a person, or replace all samples of an enrolled one, and update the gallery.
+
+    Returns None, with the samples kept in the store for the next training,
+    when the current model has people the store does not know about.
+    """
+    store = EmbeddingStore(store_path)
+    label_map = load_label_map()
+    covered = store_covers_gallery(store, label_map)
+    # Never hand out a label the current model already uses for someone else
+    store.update([(key, info, sample_names, encodings, files)], first_label=max(label_map, default=-1) + 1)
+    if not covered:
+        logging.warning(f"Gallery not updated for {key}: the model has people missing from the embedding "
+                        f"store, retrain it")
+        return None
+    return rebuild_gallery(store)
+
+
+def _remove_from_gallery(store, keys):
+    covered = store_covers_gallery(store, load_label_map())
+    store.update(removed=keys)
+    if covered:
+        rebuild_gallery(store)
+    else:
+        logging.warning(f"Gallery not updated after removing {', '.join(keys)}: the model has people missing "
+                        f"from the embedding store, retrain it")
+
+
+def remove_person(key, store_path=EMBEDDING_STORE_PATH):
+    """Drop a person from the store and the gallery; returns False if they were not enrolled"""
+    store = EmbeddingStore(store_path)
+    if key not in store:
+        return False
+    _remove_from_gallery(store, [key])
+    return True
+
+
+def remove_enrolled(person_type, person_id, store_path=EMBEDDING_STORE_PATH):
+    """Drop a deleted student or teacher from the store and the gallery; returns how many entries went"""
+    id_key = "student_id" if person_type == "student" else "user_id"
+    store = EmbeddingStore(store_path)
+    keys = [person["key"] for person in store.people
+            if person["info"].get("type") == person_type and str(person["info"].get(id_key)) == str(person_id)]
+    if keys:
+        _remove_from_gallery(store, keys)
+    return len(keys)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Change enrolled people without retraining the recognition model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List enrolled people")
+    remove = subparsers.add_parser("remove", help="Remove enrolled people")
+    remove.add_argument("keys", nargs="+", help="Store keys as shown by list, e.g. students/12_Jane_Doe")
+    rebuild = subparsers.add_parser("rebuild", help="Rebuild the face index and label map from the store")
+    rebuild.add_argument("--force", action="store_true",
+                         help="Rebuild even if the current model has people missing from the store")
+    parser.add_argument("--store", default=EMBEDDING_STORE_PATH, help="Embedding store directory")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
+    store = EmbeddingStore(args.store)
+
+    if args.command == "list":
+        for person in store.people:
+            print(f"{person['key']}\tlabel {person['label']}\t{person['count']} samples")
+        return 0
+
+    covered = store_covers_gallery(store, load_label_map())
+    if args.command == "remove":
+        missing = [key for key in args.keys if key not in store]
+        for key in missing:
+            logging.error(f"{key} is not enrolled")
+        if len(missing) < len(args.keys):
+            store.update(removed=args.keys)
+            if not covered:
+                logging.error("The model has people missing from the embedding store; retrain it to apply the removal")
+                return 1
+            rebuild_gallery(store)
+        return 1 if missing else 0
+
+    if not covered and not args.force:
+        logging.error("The model has people missing from the embedding store; retrain it or pass --force")
+        return 1
+    rebuild_gallery(store)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
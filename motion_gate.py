@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap frame-difference check run before face detection.
+
+    Every frame is shrunk to a small grayscale thumbnail and compared with
+    the thumbnail of the last frame that went through full detection. While
+    fewer than `threshold` of its pixels changed by more than `pixel_delta`,
+    the previous detections are reused. A full pass is forced at least every
+    `heartbeat` frames so people who sit still are still re-identified.
+    """
+
+    def __init__(self, threshold=0.01, pixel_delta=25, heartbeat=15, size=(80, 60)):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.heartbeat = heartbeat
+        self.size = size
+        self.reference = None
+        self.thumbnail = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.diff = np.empty_like(self.gray)
+        self.skipped = 0
+        self.total_skipped = 0
+        self.last_change = 1.0
+
+    def reset(self):
+        self.reference = None
+        self.skipped = 0
+
+    def should_process(self, frame):
+        """Return True when the BGR frame needs full detection"""
+        cv2.resize(frame, self.size, dst=self.thumbnail, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.thumbnail, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+        if self.reference is not None and self.skipped + 1 < self.heartbeat:
+            cv2.absdiff(self.gray, self.reference, dst=self.diff)
+            self.last_change = np.count_nonzero(self.diff > self.pixel_delta) / self.diff.size
+            if self.last_change < self.threshold:
+                self.skipped += 1
+                self.total_skipped += 1
+                return False
+        else:
+            self.last_change = 1.0
+
+        if self.reference is None:
+            self.reference = self.gray.copy()
+        else:
+            np.copyto(self.reference, self.gray)
+        self.skipped = 0
+        return True
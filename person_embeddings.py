@@ -0,0 +1,81 @@
+import logging
+import os
+import numpy as np
+from config import VALID_IMAGE_EXTENSIONS
+
+# Written next to the images of a capture folder
+EMBEDDINGS_FILE = "embeddings.npz"
+
+
+def dataset_person(person_type, person_folder):
+    """Embedding store key and label info of a dataset/<type>s/<id>_<name> folder"""
+    try:
+        person_id, person_name = person_folder.split('_', 1)
+    except ValueError:
+        person_id = person_folder
+        person_name = "Unknown"
+    id_key = "student_id" if person_type == "student" else "user_id"
+    return f"{person_type}s/{person_folder}", {id_key: person_id, "name": person_name, "type": person_type}
+
+
+def image_stamps(person_dir):
+    """{image file name: [mtime_ns, size]} for every image in a person folder"""
+    stamps = {}
+    for entry in os.scandir(person_dir):
+        if entry.is_file() and entry.name.lower().endswith(VALID_IMAGE_EXTENSIONS):
+            stat = entry.stat()
+            stamps[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    return stamps
+
+
+def store_is_stale(store, key, stamps):
+    """True when images were added, removed or edited since the store entry was written.
+
+    `stamps` is the current image_stamps() of the person folder; the store
+    keeps the stamps it was built from, so a photo replaced in place under
+    the same name is noticed too.
+    """
+    person = store.find(key)
+    return person is None or person.get("files") != stamps
+
+
+def embeddings_path(person_dir):
+    return os.path.join(person_dir, EMBEDDINGS_FILE)
+
+
+def save_person_embeddings(person_dir, encodings):
+    """Store {image file name: encoding} for one person as float32 arrays"""
+    names = sorted(encodings)
+    matrix = np.array([encodings[name] for name in names], dtype=np.float32).reshape(len(names), -1)
+    path = embeddings_path(person_dir)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, names=np.array(names), encodings=matrix)
+    os.replace(tmp_path, path)
+
+
+def load_person_embeddings(person_dir):
+    """Return {image path: encoding} for the images the embedding file is still valid for.
+
+    Images changed after the file was written are left out, so the caller
+    encodes them again from disk.
+    """
+    path = embeddings_path(person_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            names, matrix = data["names"], data["encodings"]
+        written = os.stat(path).st_mtime_ns
+    except Exception as e:
+        logging.error(f"Failed to load embeddings {path}: {e}")
+        return {}
+
+    encodings = {}
+    for name, encoding in zip(names, matrix):
+        img_path = os.path.join(person_dir, str(name))
+        try:
+            if os.stat(img_path).st_mtime_ns <= written:
+                encodings[img_path] = encoding.astype(np.float64)
+        except OSError:
+            continue
+    return encodings
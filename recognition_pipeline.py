@@ -0,0 +1,248 @@
+import logging
+import os
+import pickle
+import time
+from contextlib import nullcontext
+import cv2
+import joblib
+import numpy as np
+from face_index import load_index
+from face_tracker import FaceTracker, UNKNOWN_FACE
+from motion_gate import MotionGate
+from face_detector import create_detector
+from face_encoder import encode_faces, extract_face_chips
+from adaptive_controller import AdaptiveController
+from config import MODEL_PATH, LABEL_MAP_PATH, FACE_INDEX_PATH, RECOGNITION_TOLERANCE
+from config import TRACKER_IOU_THRESHOLD, TRACKER_REIDENTIFY_INTERVAL, TRACKER_RETRY_INTERVAL
+from config import TRACKER_MAX_MISSED, TRACKER_CONFIDENT_DISTANCE
+from config import DETECTOR_BACKEND, DETECTION_SCALE
+from config import ADAPTIVE_CONTROL_ENABLED, TARGET_FRAME_LATENCY, MIN_DETECTION_SCALE, MAX_DETECTION_SCALE
+from config import MAX_FRAME_STRIDE
+from config import MOTION_GATE_ENABLED, MOTION_THRESHOLD, MOTION_PIXEL_DELTA, MOTION_HEARTBEAT
+
+
+def load_recognition_model():
+    """Load the SVM, its label map and the face index, either of which may be None.
+
+    People enrolled since the last full training are only in the face index,
+    so the index alone is enough to recognise them.
+    """
+    has_model, has_index = os.path.exists(MODEL_PATH), os.path.exists(FACE_INDEX_PATH)
+    if not os.path.exists(LABEL_MAP_PATH) or not (has_model or has_index):
+        raise FileNotFoundError("Model or label map files not found")
+
+    model = joblib.load(MODEL_PATH) if has_model else None
+    with open(LABEL_MAP_PATH, 'rb') as f:
+        reverse_label_map = pickle.load(f)
+
+    face_index = None
+    if has_index:
+        face_index = load_index(FACE_INDEX_PATH)
+        logging.info(f"Face index loaded: {face_index.backend} backend, {len(face_index)} samples")
+    else:
+        logging.warning("Face index not found, falling back to SVM classification")
+    return model, reverse_label_map, face_index
+
+
+def scale_locations(face_locations, scale):
+    """Map face locations found on a downscaled frame back to full resolution"""
+    return [
+        (int(top / scale), int(right / scale), int(bottom / scale), int(left / scale))
+        for top, right, bottom, left in face_locations
+    ]
+
+
+def create_controller(scale=DETECTION_SCALE):
+    """Adaptive scale/stride controller configured from config.py"""
+    return AdaptiveController(TARGET_FRAME_LATENCY, scale, min_scale=min(MIN_DETECTION_SCALE, scale),
+                              max_scale=max(MAX_DETECTION_SCALE, scale), max_stride=MAX_FRAME_STRIDE)
+
+
+class RecognitionPipeline:
+    """Detection, encoding and identification of one stream of frames, without any UI.
+
+    An optional stage_timer with a measure(stage) context manager receives the
+    time spent in every stage; the benchmark uses it to report latencies.
+    While the motion gate sees no change, or for frames the adaptive
+    controller strides over, process() returns the previous frame's result
+    without running detection. With a shared EncodingBatcher, the faces of
+    this stream are encoded and classified together with other streams'.
+    With a RecognitionWorkerPool, faces that need identifying are encoded in
+    its worker processes, and process() also runs detection there; the
+    controller is then fed the time spent in the workers.
+    """
+
+    def __init__(self, model, reverse_label_map, face_index=None, scale=DETECTION_SCALE, stage_timer=None,
+                 motion_gate=MOTION_GATE_ENABLED, detector=DETECTOR_BACKEND, adaptive=ADAPTIVE_CONTROL_ENABLED,
+                 batcher=None, worker_pool=None):
+        self.model = model
+        self.reverse_label_map = reverse_label_map
+        self.face_index = face_index
+        self.fixed_scale = scale
+        self.controller = None
+        if adaptive:
+            self.controller = create_controller(scale)
+        self.stage_timer = stage_timer
+        self.buffers = {}
+        self.batcher = batcher
+        self.worker_pool = worker_pool
+        self.worker_time = 0.0
+        self.detector_backend = detector
+        self.detector = create_detector(detector)
+        self.motion_gate = None
+        if motion_gate:
+            self.motion_gate = MotionGate(MOTION_THRESHOLD, MOTION_PIXEL_DELTA, MOTION_HEARTBEAT)
+        self.last_result = None
+        self.tracker = FaceTracker(
+            iou_threshold=TRACKER_IOU_THRESHOLD,
+            reidentify_interval=TRACKER_REIDENTIFY_INTERVAL,
+            retry_interval=TRACKER_RETRY_INTERVAL,
+            max_missed=TRACKER_MAX_MISSED
+        )
+
+    def _stage(self, name):
+        return self.stage_timer.measure(name) if self.stage_timer else nullcontext()
+
+    def _buffer(self, name, shape):
+        """Reuse one array per intermediate image instead of allocating it every frame"""
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self.buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def reset(self):
+        """Forget tracks and cached detections, e.g. when the stream changes"""
+        self.tracker.reset()
+        if self.motion_gate:
+            self.motion_gate.reset()
+        self.last_result = None
+
+    @property
+    def scale(self):
+        return self.controller.scale if self.controller else self.fixed_scale
+
+    @property
+    def can_identify(self):
+        return (self.model is not None or self.face_index is not None) and bool(self.reverse_label_map)
+
+    def detect(self, rgb_frame):
+        with self._stage("resize"):
+            scale = self.scale
+            height, width = rgb_frame.shape[:2]
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            small_frame = cv2.resize(rgb_frame, size, dst=self._buffer("small", (size[1], size[0], 3)))
+        with self._stage("detection"):
+            face_locations = self.detector.detect(small_frame)
+        return scale_locations(face_locations, scale)
+
+    def process(self, frame):
+        """Return (face_locations, face_names) for a BGR frame"""
+        if self.controller and self.last_result is not None and self.controller.should_skip():
+            return self.last_result
+        if self.motion_gate:
+            with self._stage("motion"):
+                changed = self.motion_gate.should_process(frame)
+            if not changed and self.last_result is not None:
+                return self.last_result
+
+        start = time.perf_counter()
+        self.worker_time = 0.0
+        self.last_result = self._process(frame)
+        if self.controller:
+            # Waiting for a shared pool is not this stream's cost
+            elapsed = self.worker_time if self.worker_pool else time.perf_counter() - start
+            self.controller.record(elapsed, len(self.last_result[0]))
+        return self.last_result
+
+    def _process(self, frame):
+        if self.worker_pool:
+            with self._stage("detection"):
+                face_locations, elapsed = self.worker_pool.detect(frame, self.scale, self.detector_backend)
+            self.worker_time += elapsed
+            return face_locations, self.identify_faces(frame, face_locations)
+
+        with self._stage("color"):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._buffer("rgb", frame.shape))
+        face_locations = self.detect(rgb_frame)
+        return face_locations, self.identify_faces(frame, face_locations, rgb_frame)
+
+    def identify_faces(self, frame, face_locations, rgb_frame=None):
+        """Names of the faces detected in a BGR frame, which must come in stream order.
+
+        Tracked faces keep their identity; only new tracks and tracks due for
+        re-identification are encoded and classified.
+        """
+        if not self.can_identify:
+            return [UNKNOWN_FACE] * len(face_locations)
+
+        with self._stage("tracking"):
+            tracks, pending = self.tracker.update(face_locations)
+        if pending:
+            pending_locations = [face_locations[i] for i in pending]
+            if self.worker_pool:
+                with self._stage("encoding"):
+                    face_encodings, elapsed = self.worker_pool.encode(frame, pending_locations)
+                self.worker_time += elapsed
+                identities, confident = self.classify(face_encodings)
+            else:
+                if rgb_frame is None:
+                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._buffer("rgb", frame.shape))
+                if self.batcher:
+                    identities, confident = self._classify_batched(rgb_frame, pending_locations)
+                else:
+                    with self._stage("encoding"):
+                        face_encodings = encode_faces(rgb_frame, pending_locations)
+                    identities, confident = self.classify(face_encodings)
+            for i, identity, is_confident in zip(pending, identities, confident):
+                self.tracker.assign(tracks[i], identity, is_confident)
+        return [track.identity for track in tracks]
+
+    def _classify_batched(self, rgb_frame, face_locations):
+        with self._stage("encoding"):
+            chips = extract_face_chips(rgb_frame, face_locations)
+        try:
+            with self._stage("batched_classification"):
+                return self.batcher.submit(chips).result()
+        except Exception as e:
+            logging.error(f"Error in batched face encoding: {e}")
+            return [UNKNOWN_FACE] * len(face_locations), [False] * len(face_locations)
+
+    def classify(self, face_encodings):
+        """identify() with stage timing, treating every face as unknown if prediction fails"""
+        try:
+            with self._stage("classification"):
+                return self.identify(face_encodings)
+        except Exception as e:
+            logging.error(f"Error predicting faces: {e}")
+            return [UNKNOWN_FACE] * len(face_encodings), [False] * len(face_encodings)
+
+    def identify(self, face_encodings):
+        """Identify every encoding with one batched lookup.
+
+        Returns the (name, person_id, person_type) of each encoding and whether
+        the match is confident enough for the tracker to trust it for a while.
+        """
+        if not face_encodings:
+            return [], []
+
+        if self.face_index is not None:
+            label_ids, distances = self.face_index.search(np.array(face_encodings))
+            accepted = distances <= RECOGNITION_TOLERANCE
+            confident = distances <= TRACKER_CONFIDENT_DISTANCE
+        else:
+            probabilities = self.model.predict_proba(np.array(face_encodings))
+            label_ids = self.model.classes_[np.argmax(probabilities, axis=1)]
+            accepted = np.max(probabilities, axis=1) >= 0.6
+            confident = accepted
+
+        face_names = []
+        for label_id, is_match in zip(label_ids, accepted):
+            person_info = self.reverse_label_map.get(int(label_id)) if is_match else None
+            if not person_info:
+                face_names.append(UNKNOWN_FACE)
+                continue
+            name = person_info.get('name', 'Unknown')
+            person_id = person_info.get('student_id', person_info.get('user_id', None))
+            person_type = person_info.get('type', None)
+            face_names.append((name, person_id, person_type))
+        return face_names, [bool(c) and name is not UNKNOWN_FACE for c, name in zip(confident, face_names)]
@@ -0,0 +1,461 @@
+"""Recognition for every room of a building from one server.
+
+Each configured room (the `location` of its seances) has a frame source.
+While a seance takes place in a room its camera is opened, and frames from
+all cameras are recognised by one shared worker pool:
+
+    python recognition_scheduler.py --room "Salle A1=0" --room "Salle B2=rtsp://10.0.0.12/stream"
+    python recognition_scheduler.py --config building.json
+
+building.json: {"rooms": {"Salle A1": 0, "Salle B2": {"source": "rtsp://...", "frame_budget": 2}},
+"workers": 4, "db_host": "10.0.0.5"}
+"""
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from database import DatabaseConnection, SeanceDB, AttendanceDB, StudentDB, TeacherDB
+from attendance_writer import AttendanceWriter
+from roster_cache import RosterCache
+from recognition_pipeline import RecognitionPipeline, load_recognition_model
+from encoding_batcher import EncodingBatcher
+from recognition_workers import RecognitionWorkerPool
+from face_encoder import resolve_workers
+from recognition_service import seance_window
+from frame_source import open_frame_source
+from config import ROOM_CAMERAS, RECOGNITION_WORKERS, RECOGNITION_PROCESSES, CAMERA_FRAME_BUDGET, SEANCE_POLL_INTERVAL
+from config import SCHEDULER_ERROR_BACKOFF
+from config import ENCODING_BATCH_SIZE, ENCODING_BATCH_DELAY
+from config import DETECTION_SCALE, ATTENDANCE_FLUSH_INTERVAL, ATTENDANCE_FLUSH_SIZE
+
+
+class CameraFeed:
+    """One room's frame source, read on its own thread.
+
+    Only the newest frame is kept: when the workers fall behind, older frames
+    are dropped instead of queueing up latency. A feed hands out at most one
+    frame at a time, so its tracker always sees frames in order, and no more
+    than `frame_budget` frames per second.
+    """
+
+    def __init__(self, location, source_spec, pipeline, frame_budget=CAMERA_FRAME_BUDGET):
+        self.location = location
+        self.source_spec = source_spec
+        self.pipeline = pipeline
+        self.frame_budget = frame_budget
+        self.source = None
+        self.seance = None
+        self.seance_end_time = None
+        self.latest_frame = None
+        self.busy = False
+        self.next_due = 0.0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.faces = 0
+        self.present = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.on_frame = None
+
+    def bind(self, seance):
+        """Attach the seance taking place in this room; a new seance starts with fresh tracks"""
+        if self.seance and self.seance['seance_id'] != seance['seance_id']:
+            self.pipeline.reset()
+            self.present = set()
+        self.seance = seance
+        _, self.seance_end_time = seance_window(seance)
+
+    def open(self):
+        self.source = open_frame_source(self.source_spec)
+        if not self.source.open():
+            return False
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._read_frames, name=f"camera-{self.location}", daemon=True)
+        self.thread.start()
+        return True
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.thread = None
+        if self.source:
+            self.source.release()
+
+    @property
+    def is_open(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _read_frames(self):
+        while not self.stop_event.is_set():
+            ret, frame = self.source.read()
+            if not ret:
+                if self.source.finished or not self.source.is_live:
+                    logging.info(f"Frame source of {self.location} ended")
+                    break
+                time.sleep(0.01)
+                continue
+            with self.lock:
+                if self.latest_frame is not None:
+                    self.frames_dropped += 1
+                self.latest_frame = frame
+                self.frames_read += 1
+            if self.on_frame:
+                self.on_frame()
+
+    def take_frame(self, now):
+        """Return the newest frame if the feed is idle and within its budget, else None"""
+        with self.lock:
+            if self.busy or self.latest_frame is None or now < self.next_due:
+                return None
+            frame, self.latest_frame = self.latest_frame, None
+            self.busy = True
+            self.next_due = now + 1.0 / self.frame_budget if self.frame_budget else now
+            return frame
+
+    def done(self, faces):
+        with self.lock:
+            self.busy = False
+            self.frames_processed += 1
+            self.faces += faces
+
+    def status(self):
+        with self.lock:
+            return {
+                "source": repr(self.source) if self.source else str(self.source_spec),
+                "open": self.is_open,
+                "seance_id": self.seance['seance_id'] if self.seance else None,
+                "frame_budget": self.frame_budget,
+                "frames_read": self.frames_read,
+                "frames_processed": self.frames_processed,
+                "frames_dropped": self.frames_dropped,
+                "faces": self.faces,
+                "present": len(self.present),
+                "adaptive": self.pipeline.controller.status() if self.pipeline.controller else None,
+            }
+
+
+class RecognitionScheduler:
+    """Runs a CameraFeed for every room that has a seance taking place now.
+
+    Up to `workers` frames are recognised at once, each feed contributing
+    at most one so its tracker sees frames in order. The dispatcher starts
+    its round-robin scan at the next camera each pass, so a busy room cannot
+    starve the others, and each feed is limited to its frame budget.
+
+    With more than one recognition process (`processes`, 0 = one per core),
+    every feed sends detection and encoding to one shared
+    RecognitionWorkerPool, so the rooms are not confined to a single core by
+    the GIL; the dispatch threads only wait for results and run the cheap
+    tracking and classification. Otherwise the threads do the work
+    themselves and faces of concurrent frames are encoded in shared batches.
+    """
+
+    def __init__(self, db_connection, room_sources=None, workers=RECOGNITION_WORKERS,
+                 frame_budget=CAMERA_FRAME_BUDGET, scale=DETECTION_SCALE, seance_poll_interval=SEANCE_POLL_INTERVAL,
+                 processes=RECOGNITION_PROCESSES):
+        self.db_connection = db_connection
+        self.room_sources = dict(ROOM_CAMERAS if room_sources is None else room_sources)
+        self.workers = max(1, workers)
+        self.processes = resolve_workers(processes)
+        self.frame_budget = frame_budget
+        self.scale = scale
+        self.seance_poll_interval = seance_poll_interval
+        self.seance_db = SeanceDB(db_connection)
+        self.attendance_writer = AttendanceWriter(
+            AttendanceDB(db_connection),
+            flush_interval=ATTENDANCE_FLUSH_INTERVAL,
+            flush_size=ATTENDANCE_FLUSH_SIZE
+        )
+        self.roster = RosterCache(StudentDB(db_connection), TeacherDB(db_connection))
+        self.model = None
+        self.reverse_label_map = None
+        self.face_index = None
+        self.batcher = None
+        self.worker_pool = None
+        self.feeds = {}
+        self.unconfigured_rooms = set()
+        self.executor = None
+        self.slots = None
+        self.cursor = 0
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_error = None
+
+    def _room_config(self, location):
+        config = self.room_sources[location]
+        if isinstance(config, dict):
+            return config["source"], config.get("frame_budget", self.frame_budget)
+        return config, self.frame_budget
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return True
+        if not self.room_sources:
+            logging.error("No room cameras configured")
+            return False
+        try:
+            self.model, reverse_label_map, self.face_index = load_recognition_model()
+            if not self.roster.load():
+                raise ConnectionError("Could not load the enrolled students and teachers")
+            self.reverse_label_map = self.roster.filter_label_map(reverse_label_map)
+        except Exception as e:
+            logging.error(f"Failed to start recognition scheduler: {e}")
+            self.last_error = str(e)
+            return False
+
+        self.stop_event.clear()
+        self.attendance_writer.start()
+        if self.processes > 1:
+            self.worker_pool = RecognitionWorkerPool(self.processes, scale=self.scale, encode=False).start()
+        elif self.workers > 1:
+            classifier = RecognitionPipeline(self.model, self.reverse_label_map, self.face_index,
+                                             motion_gate=False, adaptive=False)
+            self.batcher = EncodingBatcher(classifier.classify, ENCODING_BATCH_SIZE, ENCODING_BATCH_DELAY,
+                                           max_requests=self.workers)
+            self.batcher.start()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recognition")
+        self.slots = threading.Semaphore(self.workers)
+        self.thread = threading.Thread(target=self._dispatch, name="recognition-scheduler", daemon=True)
+        self.thread.start()
+        logging.info(f"Recognition scheduler started for {len(self.room_sources)} rooms with {self.workers} workers "
+                     f"and {self.processes} recognition process(es)")
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.batcher:
+            self.batcher.stop()
+            self.batcher = None
+        if self.worker_pool:
+            self.worker_pool.stop()
+            self.worker_pool = None
+        for location in list(self.feeds):
+            self._close_feed(location)
+        self.attendance_writer.stop()
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _open_feed(self, location, seance):
+        source_spec, frame_budget = self._room_config(location)
+        pipeline = RecognitionPipeline(self.model, self.reverse_label_map, self.face_index, scale=self.scale,
+                                       batcher=self.batcher, worker_pool=self.worker_pool)
+        feed = CameraFeed(location, source_spec, pipeline, frame_budget)
+        feed.bind(seance)
+        feed.on_frame = self.wake_event.set
+        if not feed.open():
+            logging.error(f"Could not open the camera of {location} ({source_spec})")
+            return
+        self.feeds[location] = feed
+        logging.info(f"Recognition started in {location} for seance {seance['seance_id']}")
+
+    def _close_feed(self, location):
+        feed = self.feeds.pop(location)
+        feed.close()
+        logging.info(f"Recognition stopped in {location}: {feed.status()}")
+
+    def refresh_seances(self, now=None):
+        """Open the cameras of rooms where a seance has started; feeds close at their seance end"""
+        now = now or datetime.now()
+        active = {}
+        for seance in self.seance_db.get_active_seances(now):
+            location = (seance.get('location') or '').strip()
+            if location in self.room_sources:
+                active.setdefault(location, seance)
+            elif location not in self.unconfigured_rooms:
+                self.unconfigured_rooms.add(location)
+                logging.warning(f"Seance {seance['seance_id']} takes place in {location!r}, which has no camera")
+
+        for location, seance in active.items():
+            if location in self.feeds:
+                self.feeds[location].bind(seance)
+            else:
+                self._open_feed(location, seance)
+
+    def _dispatch(self):
+        next_refresh = 0.0
+        while not self.stop_event.is_set():
+            try:
+                now = time.monotonic()
+                if now >= next_refresh:
+                    self.refresh_seances()
+                    next_refresh = now + self.seance_poll_interval
+
+                feeds = list(self.feeds.values())
+                wall_clock = datetime.now()
+                for feed in feeds:
+                    if wall_clock >= feed.seance_end_time or (not feed.is_open and feed.latest_frame is None and not feed.busy):
+                        self._close_feed(feed.location)
+                feeds = list(self.feeds.values())
+
+                dispatched = False
+                for offset in range(len(feeds)):
+                    if not self.slots.acquire(blocking=False):
+                        break
+                    feed = feeds[(self.cursor + offset) % len(feeds)]
+                    frame = feed.take_frame(now)
+                    if frame is None:
+                        self.slots.release()
+                        continue
+                    self.executor.submit(self._process, feed, frame)
+                    dispatched = True
+                if feeds:
+                    self.cursor = (self.cursor + 1) % len(feeds)
+
+                if not dispatched:
+                    self.wake_event.wait(0.02 if feeds else 1.0)
+                    self.wake_event.clear()
+            except Exception as e:
+                # Keep the other rooms running; a failing database is retried after a pause
+                logging.error(f"Recognition scheduler error: {e}")
+                self.last_error = str(e)
+                self.stop_event.wait(SCHEDULER_ERROR_BACKOFF)
+
+    def _process(self, feed, frame):
+        faces = 0
+        try:
+            face_locations, face_names = feed.pipeline.process(frame)
+            faces = len(face_locations)
+            self._record(feed, face_names)
+        except Exception as e:
+            logging.error(f"Error recognising frame from {feed.location}: {e}")
+        finally:
+            feed.done(faces)
+            self.slots.release()
+            self.wake_event.set()
+
+    def _record(self, feed, face_names):
+        seance_id = feed.seance['seance_id']
+        for name, person_id, person_type in face_names:
+            if not person_id or not person_type or not self.roster.contains(person_id, person_type):
+                continue
+            feed.present.add((person_type, str(person_id)))
+            if self.attendance_writer.record(seance_id, person_id, "present", person_type):
+                logging.info(f"Attendance queued: {person_type} {name} (ID: {person_id}) "
+                             f"for seance {seance_id} in {feed.location}")
+
+    def status(self):
+        return {
+            "running": self.is_running,
+            "workers": self.workers,
+            "processes": self.processes,
+            "rooms": sorted(self.room_sources),
+            "cameras": {location: feed.status() for location, feed in list(self.feeds.items())},
+            "pending_attendance": len(self.attendance_writer.pending),
+            "encoding_batches": self.batcher.batches if self.batcher else 0,
+            "encoded_faces": self.batcher.faces if self.batcher else 0,
+            "last_error": self.last_error,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recognise faces in every room that has a seance taking place")
+    parser.add_argument("--config", help="JSON file with default values for the options below")
+    parser.add_argument("--room", action="append", metavar="LOCATION=SOURCE",
+                        help="Camera of a room, e.g. \"Salle A1=0\" (repeatable)")
+    parser.add_argument("--workers", type=int, help="Frames recognised concurrently across all cameras")
+    parser.add_argument("--processes", type=int, help="Recognition processes shared by all cameras, 0 = one per core")
+    parser.add_argument("--frame-budget", type=float, help="Frames per second recognised per camera")
+    parser.add_argument("--scale", type=float, help="Initial detection downscale factor")
+    parser.add_argument("--status-interval", type=float, help="Seconds between status log lines (0 = never)")
+    parser.add_argument("--log-file", help="Log to this file instead of stderr")
+    parser.add_argument("--db-host")
+    parser.add_argument("--db-user")
+    parser.add_argument("--db-password")
+    parser.add_argument("--db-name")
+    args = parser.parse_args(argv)
+
+    defaults = {
+        "rooms": dict(ROOM_CAMERAS),
+        "workers": RECOGNITION_WORKERS,
+        "processes": RECOGNITION_PROCESSES,
+        "frame_budget": CAMERA_FRAME_BUDGET,
+        "scale": DETECTION_SCALE,
+        "status_interval": 60.0,
+        "log_file": None,
+        "db_host": "localhost",
+        "db_user": "root",
+        "db_password": "",
+        "db_name": "student_management",
+    }
+    if args.config:
+        with open(args.config) as f:
+            config = {key.replace("-", "_"): value for key, value in json.load(f).items()}
+        unknown = set(config) - set(defaults)
+        if unknown:
+            parser.error(f"Unknown keys in {args.config}: {', '.join(sorted(unknown))}")
+        defaults.update(config)
+
+    rooms = dict(defaults.pop("rooms"))
+    for room in args.room or []:
+        location, separator, source = room.partition("=")
+        if not separator or not location.strip() or not source:
+            parser.error(f"Invalid --room {room!r}, expected LOCATION=SOURCE")
+        rooms[location.strip()] = source
+    args.rooms = rooms
+    for key, value in defaults.items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(filename=args.log_file, level=logging.INFO,
+                        format='%(asctime)s:%(levelname)s:%(message)s')
+
+    db_connection = DatabaseConnection(host=args.db_host, user=args.db_user, password=args.db_password,
+                                       database=args.db_name, interactive=False)
+    if not db_connection.connect():
+        logging.error("Could not connect to the database")
+        return 1
+
+    scheduler = RecognitionScheduler(db_connection, args.rooms, workers=args.workers,
+                                     frame_budget=args.frame_budget, scale=args.scale, processes=args.processes)
+
+    def handle_signal(signum, frame):
+        logging.info(f"Received signal {signum}, stopping")
+        scheduler.stop_event.set()
+        scheduler.wake_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    try:
+        if not scheduler.start():
+            return 1
+        last_report = time.time()
+        while scheduler.is_running:
+            scheduler.wait(timeout=1.0)
+            if args.status_interval and time.time() - last_report >= args.status_interval:
+                logging.info(f"Status: {scheduler.status()}")
+                last_report = time.time()
+    finally:
+        scheduler.stop()
+        db_connection.disconnect()
+    return 0 if not scheduler.last_error else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
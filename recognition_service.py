@@ -0,0 +1,295 @@
+"""Headless recognition service.
+
+Runs detection, recognition and attendance recording for a seance without any
+Tk window, for classroom machines that have no display:
+
+    python recognition_service.py --seance 12 --source 0
+    python recognition_service.py --config recognition_service.json
+
+Without --seance the seance currently taking place is picked. Options can also
+be given as a JSON config file whose keys are the long option names
+(e.g. {"source": "rtsp://camera/stream", "db_host": "10.0.0.5"}); command line
+options override it.
+"""
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from database import DatabaseConnection, SeanceDB, AttendanceDB, StudentDB, TeacherDB
+from attendance_writer import AttendanceWriter
+from roster_cache import RosterCache
+from recognition_pipeline import RecognitionPipeline, load_recognition_model
+from frame_source import open_frame_source
+from config import CAMERA_SOURCE, DETECTION_SCALE, ATTENDANCE_FLUSH_INTERVAL, ATTENDANCE_FLUSH_SIZE
+
+
+def seance_window(seance):
+    """Return the start and end datetimes of a seance row"""
+    seance_date = str(seance['date'])
+    start = datetime.strptime(f"{seance_date} {seance['start_time']}", '%Y-%m-%d %H:%M:%S')
+    end = datetime.strptime(f"{seance_date} {seance['end_time']}", '%Y-%m-%d %H:%M:%S')
+    return start, end
+
+
+class RecognitionService:
+    """Recognition and attendance recording for one seance on one frame source.
+
+    start() returns immediately and recognition runs on a background thread
+    until stop() is called, the seance ends or a recorded source is
+    exhausted. status() can be polled from any thread.
+    """
+
+    def __init__(self, db_connection, seance_id=None, source=CAMERA_SOURCE, scale=DETECTION_SCALE, paced=True,
+                 stop_at_seance_end=True):
+        self.db_connection = db_connection
+        self.seance_id = seance_id
+        self.source_spec = source
+        self.scale = scale
+        self.paced = paced
+        self.stop_at_seance_end = stop_at_seance_end
+        self.seance_db = SeanceDB(db_connection)
+        self.attendance_writer = AttendanceWriter(
+            AttendanceDB(db_connection),
+            flush_interval=ATTENDANCE_FLUSH_INTERVAL,
+            flush_size=ATTENDANCE_FLUSH_SIZE
+        )
+        self.roster = RosterCache(StudentDB(db_connection), TeacherDB(db_connection))
+        self.seance = None
+        self.seance_end_time = None
+        self.source = None
+        self.pipeline = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.started_at = None
+        self.stopped_at = None
+        self.frames = 0
+        self.faces = 0
+        self.recognitions = 0
+        self.present = set()
+        self.last_error = None
+
+    def _select_seance(self):
+        if self.seance_id is not None:
+            seance = self.seance_db.get_seance_by_id(self.seance_id)
+            if not seance:
+                raise ValueError(f"Seance {self.seance_id} not found")
+            return seance
+        seances = self.seance_db.get_active_seances()
+        if not seances:
+            raise ValueError("No seance is taking place now")
+        return seances[0]
+
+    def start(self):
+        if self.is_running:
+            return True
+        self._reset_stats()
+        self.stop_event.clear()
+        try:
+            self.seance = self._select_seance()
+            _, self.seance_end_time = seance_window(self.seance)
+            model, reverse_label_map, face_index = load_recognition_model()
+            if not self.roster.load():
+                raise ConnectionError("Could not load the enrolled students and teachers")
+            reverse_label_map = self.roster.filter_label_map(reverse_label_map)
+            self.pipeline = RecognitionPipeline(model, reverse_label_map, face_index, scale=self.scale)
+
+            self.source = open_frame_source(self.source_spec, paced=self.paced, fallback_indices=(1, 2))
+            if not self.source.open():
+                raise IOError(f"Could not open frame source {self.source_spec}")
+        except Exception as e:
+            logging.error(f"Failed to start recognition service: {e}")
+            self.last_error = str(e)
+            return False
+
+        self.attendance_writer.start()
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._run, name="recognition-service", daemon=True)
+        self.thread.start()
+        logging.info(f"Recognition started for seance {self.seance['seance_id']} on {self.source}")
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.thread = None
+        if self.source:
+            self.source.release()
+        self.attendance_writer.stop()
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive() and self.stopped_at is None
+
+    def wait(self, timeout=None):
+        """Block until recognition stops on its own or stop() is called"""
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.stop_at_seance_end and datetime.now() >= self.seance_end_time:
+                    logging.info(f"Seance {self.seance['seance_id']} ended at {self.seance['end_time']}")
+                    break
+                ret, frame = self.source.read()
+                if not ret:
+                    if self.source.finished or not self.source.is_live:
+                        break
+                    time.sleep(0.01)
+                    continue
+                face_locations, face_names = self.pipeline.process(frame)
+                self._record(face_names)
+                with self.lock:
+                    self.frames += 1
+                    self.faces += len(face_locations)
+        except Exception as e:
+            logging.error(f"Recognition service error: {e}")
+            self.last_error = str(e)
+        finally:
+            self.source.release()
+            self.attendance_writer.stop()
+            self.stopped_at = time.time()
+            logging.info(f"Recognition stopped: {self.status()}")
+
+    def _record(self, face_names):
+        seance_id = self.seance['seance_id']
+        for name, person_id, person_type in face_names:
+            if not person_id or not person_type or not self.roster.contains(person_id, person_type):
+                continue
+            with self.lock:
+                self.recognitions += 1
+                self.present.add((person_type, str(person_id)))
+            if self.attendance_writer.record(seance_id, person_id, "present", person_type):
+                logging.info(f"Attendance queued: {person_type} {name} (ID: {person_id}) for seance {seance_id}")
+
+    def status(self):
+        """Snapshot of the service state as a JSON serialisable dict"""
+        with self.lock:
+            end = self.stopped_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "running": self.is_running,
+                "seance_id": self.seance['seance_id'] if self.seance else self.seance_id,
+                "seance_name": self.seance['name_seance'] if self.seance else None,
+                "source": repr(self.source) if self.source else str(self.source_spec),
+                "started_at": self.started_at,
+                "elapsed_s": elapsed,
+                "frames": self.frames,
+                "faces": self.faces,
+                "fps": self.frames / elapsed if elapsed else 0.0,
+                "recognitions": self.recognitions,
+                "present": len(self.present),
+                "pending_attendance": len(self.attendance_writer.pending),
+                "adaptive": self.pipeline.controller.status() if self.pipeline and self.pipeline.controller else None,
+                "last_error": self.last_error,
+            }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run face recognition and attendance recording without a GUI")
+    parser.add_argument("--config", help="JSON file with default values for the options below")
+    parser.add_argument("--seance", type=int, help="Seance id (default: the seance taking place now)")
+    parser.add_argument("--source", help="Camera index, video file, image folder or stream URL")
+    parser.add_argument("--scale", type=float, help="Initial detection downscale factor")
+    parser.add_argument("--unpaced", action="store_true", default=None,
+                        help="Replay recorded sources as fast as possible")
+    parser.add_argument("--ignore-seance-end", action="store_true", default=None,
+                        help="Keep running after the seance end time")
+    parser.add_argument("--status-interval", type=float, help="Seconds between status log lines (0 = never)")
+    parser.add_argument("--status-file", help="Rewrite this JSON file with the service status periodically")
+    parser.add_argument("--log-file", help="Log to this file instead of stderr")
+    parser.add_argument("--db-host")
+    parser.add_argument("--db-user")
+    parser.add_argument("--db-password")
+    parser.add_argument("--db-name")
+    args = parser.parse_args(argv)
+
+    defaults = {
+        "seance": None,
+        "source": CAMERA_SOURCE,
+        "scale": DETECTION_SCALE,
+        "unpaced": False,
+        "ignore_seance_end": False,
+        "status_interval": 60.0,
+        "status_file": None,
+        "log_file": None,
+        "db_host": "localhost",
+        "db_user": "root",
+        "db_password": "",
+        "db_name": "student_management",
+    }
+    if args.config:
+        with open(args.config) as f:
+            config = {key.replace("-", "_"): value for key, value in json.load(f).items()}
+        unknown = set(config) - set(defaults)
+        if unknown:
+            parser.error(f"Unknown keys in {args.config}: {', '.join(sorted(unknown))}")
+        defaults.update(config)
+    for key, value in defaults.items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    return args
+
+
+def write_status(path, status):
+    with open(path, "w") as f:
+        json.dump(status, f, indent=2)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(filename=args.log_file, level=logging.INFO,
+                        format='%(asctime)s:%(levelname)s:%(message)s')
+
+    db_connection = DatabaseConnection(host=args.db_host, user=args.db_user, password=args.db_password,
+                                       database=args.db_name, interactive=False)
+    if not db_connection.connect():
+        logging.error("Could not connect to the database")
+        return 1
+
+    service = RecognitionService(
+        db_connection,
+        seance_id=args.seance,
+        source=args.source,
+        scale=args.scale,
+        paced=not args.unpaced,
+        stop_at_seance_end=not args.ignore_seance_end
+    )
+
+    def handle_signal(signum, frame):
+        logging.info(f"Received signal {signum}, stopping")
+        service.stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    try:
+        if not service.start():
+            return 1
+        last_report = time.time()
+        while service.is_running:
+            service.wait(timeout=1.0)
+            if args.status_file:
+                write_status(args.status_file, service.status())
+            if args.status_interval and time.time() - last_report >= args.status_interval:
+                logging.info(f"Status: {service.status()}")
+                last_report = time.time()
+    finally:
+        service.stop()
+        if args.status_file:
+            write_status(args.status_file, service.status())
+        db_connection.disconnect()
+    return 0 if not service.last_error else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
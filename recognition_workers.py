@@ -0,0 +1,182 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import cv2
+from face_detector import get_detector
+from face_encoder import encode_faces, resolve_workers
+from frame_ring import attach
+from recognition_pipeline import scale_locations
+from config import DETECTOR_BACKEND, DETECTION_SCALE
+
+
+def detect_and_encode(frame, scale, encode=True, detector=DETECTOR_BACKEND):
+    """Detect and encode every face of a BGR frame; runs in a worker process.
+
+    Also returns the time spent here, which excludes the time the frame
+    waited in the pool's queue.
+    """
+    start = time.perf_counter()
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    small_frame = cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale)
+    face_locations = scale_locations(get_detector(detector).detect(small_frame), scale)
+    face_encodings = encode_faces(rgb_frame, face_locations) if encode else []
+    return face_locations, face_encodings, time.perf_counter() - start
+
+
+def detect_frame_faces(frame, scale, detector=DETECTOR_BACKEND):
+    """Detect the faces of a BGR frame; runs in a worker process"""
+    face_locations, _, elapsed = detect_and_encode(frame, scale, False, detector)
+    return face_locations, elapsed
+
+
+def encode_frame_faces(frame, face_locations):
+    """Encode given faces of a BGR frame; runs in a worker process"""
+    start = time.perf_counter()
+    face_encodings = encode_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), face_locations)
+    return face_encodings, time.perf_counter() - start
+
+
+def detect_and_encode_slot(ring_name, slots, shape, dtype, index, scale, encode=True, detector=DETECTOR_BACKEND):
+    """detect_and_encode() on a slot of a shared FrameRing, read without pickling the frame"""
+    return detect_and_encode(attach(ring_name, slots, shape, dtype)[index], scale, encode, detector)
+
+
+class RecognitionWorkerPool:
+    """Detection and encoding of live frames across worker processes.
+
+    Each submitted frame gets a sequence number and collect() hands results
+    back strictly in submission order, so the display and attendance stage
+    never sees frames out of order. At most `max_in_flight` frames are queued;
+    submit() returns None when the pool is full and the caller should drop
+    the frame. With `encode` the workers encode every face they find;
+    without it they only detect, and the caller runs its tracker over the
+    ordered results and sends just the faces that need identifying to
+    encode(). Frames the caller decides not to process can be queued with
+    skip() so they come back in order and can reuse the previous result.
+
+    Frames held in a shared FrameRing can be submitted by slot index with
+    submit_slot(); workers then read them from shared memory. An optional
+    AdaptiveController picks the detection scale of every submitted frame
+    and is fed the time each one took inside its worker; the time spent
+    waiting behind other frames in flight is not the workers' cost.
+    """
+
+    def __init__(self, workers=0, scale=DETECTION_SCALE, encode=True, max_in_flight=None, ring=None,
+                 detector=DETECTOR_BACKEND, controller=None):
+        self.workers = resolve_workers(workers)
+        self.ring = ring
+        self.scale = scale
+        self.encode = encode
+        self.detector = detector
+        self.controller = controller
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.executor = None
+        self.in_flight = {}
+        self.next_seq = 0
+        self.next_result = 0
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.in_flight.clear()
+        self.next_result = self.next_seq
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def has_capacity(self):
+        return len(self.in_flight) < self.max_in_flight
+
+    def submit(self, frame):
+        """Queue a BGR frame; returns its sequence number, or None if the pool is full"""
+        if not self.has_capacity:
+            return None
+        return self._submit(frame, detect_and_encode, frame, self.current_scale, self.encode, self.detector)
+
+    def submit_slot(self, index):
+        """Queue the frame in slot `index` of the ring; collect() returns the index in place of the frame"""
+        if not self.has_capacity:
+            return None
+        ring = self.ring
+        if not ring.shared:
+            return self._submit(index, detect_and_encode, ring.frame(index), self.current_scale, self.encode,
+                                self.detector)
+        return self._submit(index, detect_and_encode_slot, ring.name, ring.slots, ring.shape, ring.dtype.str,
+                            index, self.current_scale, self.encode, self.detector)
+
+    def skip(self, item):
+        """Queue a frame without processing it; collect() returns it in order with None results"""
+        if not self.has_capacity:
+            return None
+        return self._queue(item, None)
+
+    def detect(self, frame, scale=None, detector=None):
+        """Detect faces of a BGR frame in a worker, waiting for the result; returns (face_locations, elapsed).
+
+        Like encode(), this bypasses the sequence numbers and can be called
+        from any number of threads, each waiting for its own frame.
+        """
+        return self.executor.submit(detect_frame_faces, frame, scale or self.current_scale,
+                                    detector or self.detector).result()
+
+    def encode(self, frame, face_locations):
+        """Encode faces of a BGR frame in a worker, waiting for the result; returns (encodings, elapsed)"""
+        return self.executor.submit(encode_frame_faces, frame, face_locations).result()
+
+    def _submit(self, item, fn, *args):
+        return self._queue(item, self.executor.submit(fn, *args))
+
+    def _queue(self, item, future):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.in_flight[seq] = (item, future)
+        return seq
+
+    def _is_done(self, seq):
+        future = self.in_flight[seq][1]
+        return future is None or future.done()
+
+    @property
+    def current_scale(self):
+        return self.controller.scale if self.controller else self.scale
+
+    def collect(self, timeout=None):
+        """Return the finished (seq, frame or slot, face_locations, face_encodings) that are next in order.
+
+        Waits up to `timeout` seconds for the oldest frame; later frames that
+        finished first are held back until it is done. Skipped frames have
+        None for both face_locations and face_encodings.
+        """
+        head = self.in_flight.get(self.next_result)
+        if head is None:
+            return []
+        if not self._is_done(self.next_result):
+            wait([head[1]], timeout=timeout, return_when=FIRST_COMPLETED)
+
+        results = []
+        while self.next_result in self.in_flight and self._is_done(self.next_result):
+            frame, future = self.in_flight.pop(self.next_result)
+            if future is None:
+                results.append((self.next_result, frame, None, None))
+                self.next_result += 1
+                continue
+            try:
+                face_locations, face_encodings, elapsed = future.result()
+                if self.controller:
+                    self.controller.record(elapsed, len(face_locations))
+            except Exception as e:
+                logging.error(f"Error detecting faces in frame {self.next_result}: {e}")
+                face_locations, face_encodings = [], []
+            results.append((self.next_result, frame, face_locations, face_encodings))
+            self.next_result += 1
+        return results
@@ -0,0 +1,66 @@
+import logging
+import threading
+import weakref
+
+_live_rosters = weakref.WeakSet()
+
+
+def notify_enrolment_change(person_type, person_id, enrolled=True):
+    """Propagate an added or removed student/teacher to every loaded roster"""
+    for roster in list(_live_rosters):
+        if enrolled:
+            roster.add(person_id, person_type)
+        else:
+            roster.discard(person_id, person_type)
+
+
+class RosterCache:
+    """In-memory set of valid (person_type, person_id) pairs for live recognition"""
+
+    def __init__(self, student_db, teacher_db):
+        self.student_db = student_db
+        self.teacher_db = teacher_db
+        self.members = set()
+        self.loaded = False
+        self.lock = threading.Lock()
+        _live_rosters.add(self)
+
+    @staticmethod
+    def _key(person_id, person_type):
+        return person_type, str(person_id)
+
+    def load(self):
+        try:
+            members = {self._key(person_id, "student") for person_id in self.student_db.get_student_ids()}
+            members.update(self._key(person_id, "teacher") for person_id in self.teacher_db.get_teacher_ids())
+        except Exception as e:
+            logging.error(f"Error loading recognition roster: {e}")
+            return False
+        with self.lock:
+            self.members = members
+            self.loaded = True
+        logging.info(f"Recognition roster loaded with {len(members)} persons")
+        return True
+
+    def contains(self, person_id, person_type):
+        return self._key(person_id, person_type) in self.members
+
+    def filter_label_map(self, reverse_label_map):
+        """Drop label map entries of persons that are not enrolled anymore"""
+        valid_label_map = {}
+        for label_id, info in reverse_label_map.items():
+            person_id = info.get('student_id', info.get('user_id', None))
+            person_type = info.get('type', None)
+            if person_id and person_type and self.contains(person_id, person_type):
+                valid_label_map[label_id] = info
+            else:
+                logging.warning(f"Removing invalid entry from label map: {info}")
+        return valid_label_map
+
+    def add(self, person_id, person_type):
+        with self.lock:
+            self.members.add(self._key(person_id, person_type))
+
+    def discard(self, person_id, person_type):
+        with self.lock:
+            self.members.discard(self._key(person_id, person_type))
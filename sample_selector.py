@@ -0,0 +1,137 @@
+import logging
+import math
+import cv2
+import numpy as np
+from face_encoder import face_landmarks_5, extract_face_chips, encode_face_chips
+from config import IMG_SIZE, SAMPLE_MIN_SHARPNESS, SAMPLE_BRIGHTNESS_RANGE, SAMPLE_MIN_CONTRAST
+from config import SAMPLE_MAX_YAW, SAMPLE_MAX_ROLL, SAMPLE_MIN_DISTANCE, SAMPLE_PATIENCE
+
+
+# Shown to the person being captured while their samples are rejected
+REJECTION_HINTS = {
+    "blurred": "hold still",
+    "lighting": "improve the lighting",
+    "pose": "face the camera",
+    "duplicate": "move your head slightly",
+}
+
+
+def sharpness(gray):
+    """Variance of the Laplacian: low for blurred or out of focus images"""
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def head_pose(shape):
+    """Approximate (yaw, roll) from 5-point landmarks.
+
+    Yaw is the offset of the nose from the middle of the eyes relative to the
+    eye distance, about 0 for a frontal face; roll is the eye line angle in
+    degrees.
+    """
+    points = np.array([(shape.part(i).x, shape.part(i).y) for i in range(5)], dtype=np.float64)
+    right_eye, left_eye, nose = points[0:2].mean(axis=0), points[2:4].mean(axis=0), points[4]
+    dx, dy = left_eye - right_eye
+    eye_distance = math.hypot(dx, dy)
+    if eye_distance == 0:
+        return float("inf"), 0.0
+    yaw = abs(nose[0] - (right_eye[0] + left_eye[0]) / 2.0) / eye_distance
+    roll = abs(math.degrees(math.atan2(dy, dx)))
+    # Eye order depends on the model; only the angle to the horizontal matters
+    return yaw, min(roll, 180.0 - roll)
+
+
+class SampleSelector:
+    """Chooses which face crops of an enrolment capture are worth keeping.
+
+    Cheap checks run first on the resized crop (sharpness, brightness and
+    contrast), then the 5-point landmarks reject turned or tilted heads, and
+    finally the crop is encoded and kept only if it is at least
+    `min_distance` away from every embedding kept so far, so near duplicates
+    of a person sitting still are skipped. Every `patience` rejections for
+    the same reason since the last kept sample, the threshold behind that
+    reason is relaxed. A dim room, a soft-focus camera or a person sitting
+    still therefore slows the capture down but does not stall it.
+
+    evaluate() only judges a candidate; keep() is called once the sample has
+    actually been written to disk, so dropped or failed samples do not block
+    later similar ones.
+    """
+
+    def __init__(self, min_sharpness=SAMPLE_MIN_SHARPNESS, brightness_range=SAMPLE_BRIGHTNESS_RANGE,
+                 min_contrast=SAMPLE_MIN_CONTRAST, max_yaw=SAMPLE_MAX_YAW, max_roll=SAMPLE_MAX_ROLL,
+                 min_distance=SAMPLE_MIN_DISTANCE, patience=SAMPLE_PATIENCE, size=IMG_SIZE):
+        self.base_thresholds = (min_sharpness, tuple(brightness_range), min_contrast, max_yaw, max_roll, min_distance)
+        self.patience = patience
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        (self.min_sharpness, self.brightness_range, self.min_contrast,
+         self.max_yaw, self.max_roll, self.min_distance) = self.base_thresholds
+        self.kept = []
+        self.misses = {}
+        self.rejected = {}
+        self.last_rejection = None
+
+    @property
+    def hint(self):
+        """Advice for the person being captured, or None while samples are accepted"""
+        return REJECTION_HINTS.get(self.last_rejection)
+
+    def _reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        self.last_rejection = reason
+        self.misses[reason] = self.misses.get(reason, 0) + 1
+        if self.misses[reason] >= self.patience:
+            self.misses[reason] = 0
+            self._relax(reason)
+        return None
+
+    def _relax(self, reason):
+        if reason == "blurred":
+            self.min_sharpness *= 0.8
+        elif reason == "lighting":
+            low, high = self.brightness_range
+            self.brightness_range = (max(0, low - 10), min(255, high + 10))
+            self.min_contrast *= 0.8
+        elif reason == "pose":
+            self.max_yaw *= 1.2
+            self.max_roll *= 1.2
+        elif reason == "duplicate":
+            self.min_distance *= 0.8
+        else:
+            return
+        logging.info(f"Relaxed the {reason} check after {self.patience} rejections")
+
+    def evaluate(self, rgb_frame, location):
+        """Return (crop, encoding) for a face worth keeping, else None and record why"""
+        top, right, bottom, left = location
+        crop = rgb_frame[top:bottom, left:right]
+        if crop.size == 0:
+            return self._reject("empty")
+        crop = cv2.resize(crop, (self.size, self.size))
+
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        if sharpness(gray) < self.min_sharpness:
+            return self._reject("blurred")
+        brightness, contrast = cv2.meanStdDev(gray)
+        if not self.brightness_range[0] <= brightness[0][0] <= self.brightness_range[1]:
+            return self._reject("lighting")
+        if contrast[0][0] < self.min_contrast:
+            return self._reject("lighting")
+
+        landmarks = face_landmarks_5(rgb_frame, [location])
+        yaw, roll = head_pose(landmarks[0])
+        if yaw > self.max_yaw or roll > self.max_roll:
+            return self._reject("pose")
+
+        encoding = encode_face_chips(extract_face_chips(rgb_frame, [location], landmarks=landmarks))[0]
+        if self.kept and np.linalg.norm(np.array(self.kept) - encoding, axis=1).min() < self.min_distance:
+            return self._reject("duplicate")
+
+        self.misses = {}
+        self.last_rejection = None
+        return crop, encoding
+
+    def keep(self, encoding):
+        self.kept.append(encoding)
@@ -7,15 +7,16 @@ import re
 from mysql.connector import Error
 
 class SettingsPage(ctk.CTkFrame):
-    def __init__(self, parent, current_user=None, on_logout=None):
+    def __init__(self, parent, current_user=None, on_logout=None, db_connection=None):
         super().__init__(parent)
         self.parent = parent
         self.current_user = current_user  # Store current user info (username, role)
         self.on_logout = on_logout  # Callback to handle logout after deletion
 
-        # Initialize database connections
-        self.db_connection = DatabaseConnection()
-        if not self.db_connection.connect():
+        # Reuse the application's connection; a private one is handed back to the pool on destroy
+        self.owns_connection = db_connection is None
+        self.db_connection = db_connection or DatabaseConnection()
+        if not self.db_connection.is_connected() and not self.db_connection.connect():
             messagebox.showerror("Database Error", "Failed to connect to the database.")
             return
         self.admin_db = AdminDB(self.db_connection)
@@ -483,3 +484,9 @@ class SettingsPage(ctk.CTkFrame):
         )
         self.after(3000, lambda: self.message_label.configure(text=""))
 
+
+    def destroy(self):
+        """Hand a private connection back to the pool when the page is left"""
+        if self.owns_connection:
+            self.db_connection.disconnect()
+        super().destroy()
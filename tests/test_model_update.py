@@ -0,0 +1,76 @@
+import pickle
+import numpy as np
+import pytest
+import model_update
+from embedding_store import EmbeddingStore
+from face_index import build_index, load_index, save_index
+
+PEOPLE = {
+    0: {"student_id": "1", "name": "Ann", "type": "student"},
+    1: {"student_id": "2", "name": "Bob", "type": "student"},
+    2: {"user_id": "7", "name": "Tom", "type": "teacher"},
+}
+NEW_KEY = "students/3_Eve"
+NEW_INFO = {"student_id": "3", "name": "Eve", "type": "student"}
+
+
+@pytest.fixture
+def gallery(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_update, "FACE_INDEX_PATH", str(tmp_path / "face_index.pickle"))
+    monkeypatch.setattr(model_update, "LABEL_MAP_PATH", str(tmp_path / "label_map.pickle"))
+    return tmp_path
+
+
+def encodings(seed, count=3):
+    return np.random.default_rng(seed).random((count, 128))
+
+
+def train_without_store(tmp_path):
+    """The gallery a full training wrote before the embedding store existed"""
+    labels = np.repeat(list(PEOPLE), 3)
+    save_index(build_index(np.vstack([encodings(label) for label in PEOPLE]), labels, backend="brute"),
+               model_update.FACE_INDEX_PATH)
+    with open(model_update.LABEL_MAP_PATH, "wb") as f:
+        pickle.dump(PEOPLE, f)
+
+
+def test_enroll_keeps_gallery_trained_before_store(gallery):
+    train_without_store(gallery)
+
+    assert model_update.enroll_person(NEW_KEY, NEW_INFO, ["0.jpg", "1.jpg", "2.jpg"], encodings(3),
+                                      store_path=str(gallery / "embeddings")) is None
+
+    assert model_update.load_label_map() == PEOPLE
+    assert len(load_index(model_update.FACE_INDEX_PATH)) == 9
+    # Kept for the next training, under a label the current model does not use
+    store = EmbeddingStore(str(gallery / "embeddings"))
+    assert store.find(NEW_KEY)["label"] not in PEOPLE
+
+
+def test_enroll_extends_gallery_covered_by_store(gallery):
+    store = EmbeddingStore(str(gallery / "embeddings"))
+    store.update((f"people/{label}", info, ["0.jpg", "1.jpg", "2.jpg"], encodings(label), None)
+                 for label, info in PEOPLE.items())
+    model_update.rebuild_gallery(store)
+
+    model_update.enroll_person(NEW_KEY, NEW_INFO, ["0.jpg", "1.jpg", "2.jpg"], encodings(3),
+                               store_path=str(gallery / "embeddings"))
+
+    label_map = model_update.load_label_map()
+    assert {label: info for label, info in label_map.items() if label in PEOPLE} == PEOPLE
+    assert NEW_INFO in label_map.values()
+    assert len(load_index(model_update.FACE_INDEX_PATH)) == 12
+
+    assert model_update.remove_person("people/1", store_path=str(gallery / "embeddings"))
+    assert 1 not in model_update.load_label_map()
+    assert len(load_index(model_update.FACE_INDEX_PATH)) == 9
+
+
+def test_remove_enrolled_matches_database_id(gallery):
+    store = EmbeddingStore(str(gallery / "embeddings"))
+    store.update((f"people/{label}", info, ["0.jpg"], encodings(label, 1), None) for label, info in PEOPLE.items())
+    model_update.rebuild_gallery(store)
+
+    assert model_update.remove_enrolled("teacher", 1, store_path=str(gallery / "embeddings")) == 0
+    assert model_update.remove_enrolled("student", 2, store_path=str(gallery / "embeddings")) == 1
+    assert model_update.load_label_map() == {0: PEOPLE[0], 2: PEOPLE[2]}